@@ -3,3 +3,4 @@
 from .heuristic_savings import clarke_wright_savings  # noqa
 from .heuristic_insertion import greedy_insertion  # noqa
 from .robust_cost import calculate_vrp_cost_local_robust  # noqa
+from .vrp_instance import VRPInstance  # noqa
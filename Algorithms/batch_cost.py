@@ -0,0 +1,117 @@
+"""Wektorowa ocena kosztu wielu rozwiązań naraz (NumPy).
+
+Trasy wszystkich rozwiązań trafiają do jednej tablicy (R, L) dopełnionej depotem (0),
+posortowanej malejąco po długości. Propagacja osi czasu to skan kolumna po kolumnie:
+w kroku j aktywne są tylko trasy dłuższe niż j+1 węzłów – zawsze prefiks wierszy, więc
+operujemy na widokach [:m] (bez masek). Na krok przypada kilka gatherów z macierzy
+E/P/distance i `np.maximum` z początkiem okna – dla R tras to O(L) wywołań NumPy
+zamiast O(R·L) kroków pętli Pythona.
+
+Per trasa wynik jest bitowo równy `route_cost_components` (te same działania w tej samej
+kolejności); sumy per rozwiązanie (`np.bincount`) mogą różnić się od
+`calculate_vrp_cost_local_robust` tylko kolejnością sumowania float.
+"""
+from __future__ import annotations
+from typing import Dict, List, Sequence, Tuple, Union
+
+import numpy as np
+
+from .vrp_instance import VRPInstance, as_instance
+
+__all__ = ["pad_routes", "batch_route_components", "batch_solution_costs"]
+
+
+def pad_routes(solutions: Sequence[List[List[int]]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(nodes (R, L), lengths (R,), owner (R,)) – niepuste trasy wszystkich rozwiązań.
+
+    `owner[k]` to indeks rozwiązania trasy k; wiersze posortowane malejąco po długości
+    (stabilnie), dopełnienie zerami (depot). Trasy puste ([0, 0]) są pomijane.
+    """
+    routes = [(s, r) for s, sol in enumerate(solutions) for r in sol if len(r) > 2]
+    if not routes:
+        empty = np.zeros(0, dtype=np.intp)
+        return np.zeros((0, 0), dtype=np.intp), empty, empty
+    lengths = np.fromiter((len(r) for _, r in routes), dtype=np.intp, count=len(routes))
+    owner = np.fromiter((s for s, _ in routes), dtype=np.intp, count=len(routes))
+    order = np.argsort(-lengths, kind='stable')
+    lengths = lengths[order]
+    owner = owner[order]
+    flat = np.fromiter((v for k in order for v in routes[k][1]), dtype=np.intp, count=int(lengths.sum()))
+    offsets = np.cumsum(lengths) - lengths
+    rows = np.repeat(np.arange(len(lengths)), lengths)
+    cols = np.arange(flat.size) - np.repeat(offsets, lengths)
+    nodes = np.zeros((len(lengths), int(lengths[0])), dtype=np.intp)
+    nodes[rows, cols] = flat
+    return nodes, lengths, owner
+
+
+def batch_route_components(nodes: np.ndarray, lengths: np.ndarray, inst: VRPInstance) -> Dict[str, np.ndarray]:
+    """Dystans, koniec trasy na osi E i P oraz czekanie E dla każdego wiersza `pad_routes`.
+
+    Wiersze muszą być posortowane malejąco po długości (jak zwraca `pad_routes`).
+    """
+    R = nodes.shape[0]
+    time_E, time_P, dist_matrix = inst.time_E, inst.time_P, inst.distance
+    ws_min = inst.window_start_min
+    service = inst.service_time
+    t_E = np.zeros(R)
+    t_P = np.zeros(R)
+    dist = np.zeros(R)
+    wait_E = np.zeros(R)
+    if R:
+        # liczba tras aktywnych w kroku j: długość >= j + 2 (wiersze malejąco po długości)
+        active = np.searchsorted(-lengths, -np.arange(2, nodes.shape[1] + 1), side='right')
+        for j, m in enumerate(active):
+            a = nodes[:m, j]
+            b = nodes[:m, j + 1]
+            dist[:m] += dist_matrix[a, b]
+            arrival_E = t_E[:m] + time_E[a, b]
+            arrival_P = t_P[:m] + time_P[a, b]
+            ws = ws_min[b]
+            wait_E[:m] += np.maximum(ws - arrival_E, 0.0)
+            start_E = np.maximum(arrival_E, ws)
+            start_P = np.maximum(arrival_P, ws)
+            if service > 0:
+                svc = np.where(b != 0, service, 0.0)
+                start_E += svc
+                start_P += svc
+            t_E[:m] = start_E
+            t_P[:m] = start_P
+    return {'distance': dist, 'end_E': t_E, 'end_P': t_P, 'wait_E': wait_E}
+
+
+def batch_solution_costs(solutions: Sequence[List[List[int]]],
+                         matrices: Union[Dict[str, np.ndarray], VRPInstance], time_windows=None,
+                         components: bool = False, **instance_params):
+    """Koszty (S,) rozwiązań `solutions` jednym wywołaniem – model kosztu jak w
+    `calculate_vrp_cost_local_robust`.
+
+    `components=True` – zwraca (costs, parts), gdzie `parts` to tablice (S,) per rozwiązanie:
+    total_distance_km, vehicles_used, horizon_excess_E, sum_route_time_E, waiting_E, makespan_E.
+    """
+    inst = as_instance(matrices, time_windows, **instance_params)
+    S = len(solutions)
+    nodes, lengths, owner = pad_routes(solutions)
+    comp = batch_route_components(nodes, lengths, inst)
+    end_E = comp['end_E']
+    excess = np.maximum(end_E - inst.day_horizon, 0.0)
+    vehicles = np.bincount(owner, minlength=S)
+    distance = np.bincount(owner, weights=comp['distance'], minlength=S)
+    horizon_excess = np.bincount(owner, weights=excess, minlength=S)
+    sum_end_E = np.bincount(owner, weights=end_E, minlength=S)
+    costs = (inst.cost_per_km * distance + inst.vehicle_fixed_cost * vehicles
+             + inst.penalty_horizon_per_min * horizon_excess)
+    costs += inst.time_weight * sum_end_E
+    if not components:
+        return costs
+    makespan = np.zeros(S)
+    np.maximum.at(makespan, owner, end_E)
+    parts = {
+        'total_distance_km': distance,
+        'vehicles_used': vehicles,
+        'horizon_excess_E': horizon_excess,
+        'sum_route_time_E': sum_end_E,
+        'waiting_E': np.bincount(owner, weights=comp['wait_E'], minlength=S),
+        'makespan_E': makespan,
+    }
+    return costs, parts
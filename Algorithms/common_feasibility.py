@@ -10,6 +10,10 @@ Semantyka:
 Udostępniamy tylko:
  - route_feasible_ep_classified (pełna klasyfikacja E/P/both dla jednej trasy).
  - route_feasible_ep (bool wrapper).
+ - build_window_arrays (prekompilacja okien do tablic minut względem 08:00).
+ - RouteSchedule / route_schedule + insertion_feasible / removal_feasible
+   (harmonogram z zapasem czasu – sprawdzenie wstawienia/usunięcia klienta w O(1)).
+ - arc_codes (macierz zgodności łuków: bity ARC_VIO_E / ARC_VIO_P).
 Nic więcej – brak nieużywanych wariantów solution_*.
 """
 from __future__ import annotations
@@ -17,6 +21,77 @@ from datetime import datetime
 from typing import List, Optional, Tuple, Dict
 import numpy as np
 
+WindowArrays = Tuple[np.ndarray, np.ndarray]
+
+# Kody łuków (bity) – `arc_codes`
+ARC_OK = 0
+ARC_VIO_E = 1
+ARC_VIO_P = 2
+
+# Okna liczone w minutach od 08:00 (jak dotychczas: timedelta.seconds / 60, tj. modulo doba)
+BASE_SECONDS = 8 * 3600
+
+
+def window_minutes(t) -> float:
+    """Minuty od 08:00 dla obiektu time (zgodne z (combine(t) - 08:00).seconds / 60)."""
+    return ((t.hour * 3600 + t.minute * 60 + t.second - BASE_SECONDS) % 86400) / 60
+
+
+def build_window_arrays(
+    time_windows: Optional[Dict[int, Optional[Tuple[datetime.time, datetime.time]]]],
+    n: int,
+) -> WindowArrays:
+    """Zwraca (window_start_min, window_end_min) – tablice float indeksowane węzłem.
+
+    Węzły bez okna mają granice (-inf, +inf), więc w pętli wystarczą porównania
+    i max() bez rozgałęzień na obecność okna.
+    """
+    window_start_min = np.full(n, -np.inf)
+    window_end_min = np.full(n, np.inf)
+    if time_windows:
+        for node, tw in time_windows.items():
+            if tw and 0 <= node < n:
+                window_start_min[node] = window_minutes(tw[0])
+                window_end_min[node] = window_minutes(tw[1])
+    return window_start_min, window_end_min
+
+
+def arc_codes(
+    time_E: np.ndarray,
+    time_P: np.ndarray,
+    window_arrays: WindowArrays,
+    day_horizon: int,
+    service_time: float = 0.0,
+) -> np.ndarray:
+    """Macierz (n, n) uint8: czy łuk i->j może wystąpić w dopuszczalnej trasie.
+
+    B_i (timeline po obsłudze i) jest w każdej trasie co najmniej
+    max(min_k t^E_ki, start_i) + service (depot na starcie: 0), więc gdy już przy tym
+    B_i przyjazd do j spóźnia się na osi E (lub horyzont jest przekroczony) – bit ARC_VIO_E,
+    a na osi P (B_i + t^P_ij > end_j) – bit ARC_VIO_P. Kod 0 (ARC_OK) nie gwarantuje
+    dopuszczalności; kod != 0 wyklucza każdą trasę z tym łukiem (te same porównania float
+    co w `route_feasible_ep_classified`, więc bez fałszywych odrzuceń).
+    """
+    ws_min, we_min = window_arrays
+    n = time_E.shape[0]
+    svc = np.full(n, service_time if service_time > 0 else 0.0)
+    svc[0] = 0.0
+    if n > 1:
+        incoming = time_E.astype(np.float64, copy=True)
+        np.fill_diagonal(incoming, np.inf)
+        earliest = np.maximum(incoming.min(axis=0), ws_min) + svc
+    else:
+        earliest = np.zeros(n)
+    earliest[0] = 0.0
+    arrival_E = earliest[:, None] + time_E
+    arrival_P = earliest[:, None] + time_P
+    codes = np.where(arrival_E > we_min[None, :], ARC_VIO_E, ARC_OK).astype(np.uint8)
+    codes |= np.where(arrival_P > we_min[None, :], ARC_VIO_P, ARC_OK).astype(np.uint8)
+    start = np.maximum(arrival_E, ws_min[None, :]) + svc[None, :]
+    codes |= np.where(start > day_horizon, ARC_VIO_E, ARC_OK).astype(np.uint8)
+    np.fill_diagonal(codes, ARC_OK)
+    return codes
+
 
 def route_feasible_ep_classified(
     route: List[int],
@@ -25,14 +100,20 @@ def route_feasible_ep_classified(
     time_windows: Optional[Dict[int, Optional[Tuple[datetime.time, datetime.time]]]],
     day_horizon: int,
     service_time: float = 0.0,
+    window_arrays: Optional[WindowArrays] = None,
 ) -> Tuple[bool, bool, bool, bool]:
     """Zwraca krotkę:
     (ok, violation_E, violation_P, violation_both)
     violation_both == True gdy przynajmniej jeden klient narusza okno jednocześnie dla E i P.
+
+    `window_arrays` (z `build_window_arrays`) zastępuje `time_windows` – pętla wykonuje
+    wtedy tylko odczyty z tablic i porównania float.
     """
     if not route or len(route) < 2:
         return True, False, False, False
-    base_dt = datetime.strptime("08:00", "%H:%M")
+    if window_arrays is None:
+        window_arrays = _route_window_bounds(route, time_windows)
+    ws_min, we_min = window_arrays
     timeline_E = 0.0
     vio_E = False
     vio_P = False
@@ -41,22 +122,16 @@ def route_feasible_ep_classified(
         a = route[i]; b = route[i+1]
         arrival_E = timeline_E + time_E[a, b]
         arrival_P = timeline_E + time_P[a, b]
-        if time_windows and b in time_windows and time_windows[b]:
-            ws, we = time_windows[b]
-            ws_min = (datetime.combine(base_dt.date(), ws) - base_dt).seconds / 60
-            we_min = (datetime.combine(base_dt.date(), we) - base_dt).seconds / 60
-            if arrival_E > we_min:
-                vio_E = True
-            if arrival_P > we_min:
+        we = we_min[b]
+        # mimo naruszenia kontynuujemy dla pełnej klasyfikacji (nie early-exit)
+        if arrival_E > we:
+            vio_E = True
+            if arrival_P > we:
                 vio_P = True
-            if arrival_E > we_min and arrival_P > we_min:
                 vio_both = True
-            if arrival_E > we_min or arrival_P > we_min:
-                # mimo naruszenia kontynuujemy dla pełnej klasyfikacji (nie early-exit)
-                pass
-            start_E = max(arrival_E, ws_min)
-        else:
-            start_E = arrival_E
+        elif arrival_P > we:
+            vio_P = True
+        start_E = max(arrival_E, ws_min[b])
         if b != 0 and service_time > 0:
             start_E += service_time
         timeline_E = start_E
@@ -75,9 +150,142 @@ def route_feasible_ep(
     time_windows: Optional[Dict[int, Optional[Tuple[datetime.time, datetime.time]]]],
     day_horizon: int,
     service_time: float = 0.0,
+    window_arrays: Optional[WindowArrays] = None,
 ) -> bool:
-    ok, _, _, _ = route_feasible_ep_classified(route, time_E, time_P, time_windows, day_horizon, service_time)
+    ok, _, _, _ = route_feasible_ep_classified(route, time_E, time_P, time_windows, day_horizon, service_time,
+                                               window_arrays=window_arrays)
     return ok
 
 
+def _route_window_bounds(route: List[int], time_windows) -> Tuple[Dict[int, float], Dict[int, float]]:
+    """Ścieżka zgodności (brak `window_arrays`): granice okien tylko dla węzłów trasy."""
+    ws: Dict[int, float] = {}
+    we: Dict[int, float] = {}
+    for node in route:
+        tw = time_windows.get(node) if time_windows else None
+        if tw:
+            ws[node] = window_minutes(tw[0]); we[node] = window_minutes(tw[1])
+        else:
+            ws[node] = -np.inf; we[node] = np.inf
+    return ws, we
+
+
+class RouteSchedule:
+    """Harmonogram trasy (Savelsbergh): dane do sprawdzania wstawień/usunięć w O(1).
+
+     - start[k]     – timeline_E po obsłudze węzła route[k] (B_k, jak w pętli powyżej),
+     - prefix_ok[k] – prefiks route[0..k] dopuszczalny (okna E/P i horyzont),
+     - latest[k]    – największe B_k, przy którym sufiks route[k..] pozostaje
+                      dopuszczalny (-inf gdy sufiks niedopuszczalny niezależnie od B_k).
+    Kontrola P jest punktowa (A^P = B + t^P), więc łuk a->b wymaga
+    B_a <= end_b - max(t^E_ab, t^P_ab).
+    """
+    __slots__ = ('route', 'start', 'prefix_ok', 'latest')
+
+    def __init__(self, route, start, prefix_ok, latest):
+        self.route = route
+        self.start = start
+        self.prefix_ok = prefix_ok
+        self.latest = latest
+
+    @property
+    def feasible(self) -> bool:
+        return self.prefix_ok[-1]
+
+
+def route_schedule(
+    route: List[int],
+    time_E: np.ndarray,
+    time_P: np.ndarray,
+    window_arrays: WindowArrays,
+    day_horizon: int,
+    service_time: float = 0.0,
+) -> RouteSchedule:
+    """Buduje `RouteSchedule` w O(len(route)) (przebieg w przód i wstecz)."""
+    ws_min, we_min = window_arrays
+    m = len(route)
+    start = [0.0] * m
+    prefix_ok = [True] * m
+    latest = [0.0] * m
+    timeline_E = 0.0
+    ok = True
+    for k in range(1, m):
+        a = route[k-1]; b = route[k]
+        arrival_E = timeline_E + time_E[a, b]
+        we = we_min[b]
+        if arrival_E > we or timeline_E + time_P[a, b] > we:
+            ok = False
+        timeline_E = max(arrival_E, ws_min[b])
+        if b != 0 and service_time > 0:
+            timeline_E += service_time
+        if timeline_E > day_horizon:
+            ok = False
+        start[k] = timeline_E
+        prefix_ok[k] = ok
+    latest[m-1] = day_horizon
+    for k in range(m - 2, -1, -1):
+        a = route[k]; b = route[k+1]
+        s_b = service_time if (b != 0 and service_time > 0) else 0.0
+        nxt = latest[k+1]
+        if ws_min[b] + s_b > nxt:
+            latest[k] = -np.inf
+            continue
+        t_E = time_E[a, b]
+        latest[k] = min(day_horizon, we_min[b] - max(t_E, time_P[a, b]), nxt - s_b - t_E)
+    return RouteSchedule(route, start, prefix_ok, latest)
+
+
+def _arc_start(timeline: float, a: int, b: int, time_E, time_P, ws_min, we_min, day_horizon, service_time):
+    """Przejście łukiem a->b z timeline po obsłudze a; zwraca B_b lub None przy naruszeniu."""
+    arrival_E = timeline + time_E[a, b]
+    we = we_min[b]
+    if arrival_E > we or timeline + time_P[a, b] > we:
+        return None
+    start = max(arrival_E, ws_min[b])
+    if b != 0 and service_time > 0:
+        start += service_time
+    if start > day_horizon:
+        return None
+    return start
 
+
+def insertion_feasible(
+    sched: RouteSchedule,
+    pos: int,
+    client: int,
+    time_E: np.ndarray,
+    time_P: np.ndarray,
+    window_arrays: WindowArrays,
+    day_horizon: int,
+    service_time: float = 0.0,
+) -> bool:
+    """Czy trasa po wstawieniu `client` przed pozycję `pos` (1..len-1) jest dopuszczalna – O(1)."""
+    if not sched.prefix_ok[pos-1]:
+        return False
+    ws_min, we_min = window_arrays
+    route = sched.route
+    b_c = _arc_start(sched.start[pos-1], route[pos-1], client, time_E, time_P, ws_min, we_min,
+                     day_horizon, service_time)
+    if b_c is None:
+        return False
+    b_next = _arc_start(b_c, client, route[pos], time_E, time_P, ws_min, we_min, day_horizon, service_time)
+    return b_next is not None and b_next <= sched.latest[pos]
+
+
+def removal_feasible(
+    sched: RouteSchedule,
+    pos: int,
+    time_E: np.ndarray,
+    time_P: np.ndarray,
+    window_arrays: WindowArrays,
+    day_horizon: int,
+    service_time: float = 0.0,
+) -> bool:
+    """Czy trasa po usunięciu klienta z pozycji `pos` (1..len-2) jest dopuszczalna – O(1)."""
+    if not sched.prefix_ok[pos-1]:
+        return False
+    ws_min, we_min = window_arrays
+    route = sched.route
+    b_next = _arc_start(sched.start[pos-1], route[pos-1], route[pos+1], time_E, time_P, ws_min, we_min,
+                        day_horizon, service_time)
+    return b_next is not None and b_next <= sched.latest[pos+1]
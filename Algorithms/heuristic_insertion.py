@@ -8,99 +8,286 @@ Model dualny okien (E/P): dla kroku i->j bazujemy na osi expected (E):
     B_j^S = max(A_j^S, a_j)
 Akceptacja gdy B_j^E ≤ b_j oraz (o ile kontrolujemy P) B_j^P ≤ b_j.
 Propagujemy wyłącznie B_j^E. P jest używany punktowo do weryfikacji okna.
+
+Dopuszczalność wstawienia sprawdzana w O(1) na harmonogramie trasy (`RouteSchedule`:
+czasy B_k w przód + najpóźniejsze dopuszczalne B_k wstecz), bez budowania kandydackiej
+listy dla pozycji odrzuconych; pozycje z łukiem niezgodnym z oknami (`arc_compatible`)
+pomijane są jeszcze przed tą kontrolą. Harmonogram przeliczany jest tylko dla zmienionej trasy.
+Koszt wstawienia to lokalna delta zmienianej trasy (dystans, koniec trasy E, nadmiar
+horyzontu; dla nowej trasy także koszt pojazdu) – materializowane jest tylko wybrane wstawienie.
+
+Tryby (`mode`):
+ - 'random'   – klienci w losowej kolejności (shuffle), każdy w najtańsze miejsce,
+ - 'cheapest' – zawsze wstawiany klient o najtańszym wstawieniu (cheapest insertion),
+ - 'regret'   – klient o największym żalu regret-k: Σ_{h=2..k} (c_h - c_1), gdzie c_h to
+                h-ty najlepszy koszt wstawienia po różnych trasach (nowa trasa to też opcja).
+Tryby 'cheapest' / 'regret' trzymają dla każdego nieobsłużonego klienta najlepsze wstawienie
+w każdej trasie; po wstawieniu przeliczana jest tylko zmieniona trasa, a kolejka priorytetowa
+(heapq) jest leniwa – nieaktualne wpisy odrzucane są przy zdjęciu z kopca.
 """
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple, Union
 from datetime import datetime
+import heapq
 import random as rd
 import numpy as np
 
-from .robust_cost import calculate_vrp_cost_local_robust
-from .common_feasibility import route_feasible_ep
+from .robust_cost import route_cost_contribution
+from .common_feasibility import route_feasible_ep, route_schedule, insertion_feasible
+from .vrp_instance import VRPInstance, as_instance
 
 
-def _local_feasible(route: List[int], time_E, time_P, time_windows, day_horizon, service_time, ignore_all_constraints):
+def _local_feasible(route: List[int], time_E, time_P, window_arrays, day_horizon, service_time, ignore_all_constraints):
     if ignore_all_constraints:
         return True
-    return route_feasible_ep(route, time_E, time_P, time_windows, day_horizon, service_time)
+    return route_feasible_ep(route, time_E, time_P, None, day_horizon, service_time, window_arrays=window_arrays)
+
+
+INSERTION_MODES = ('random', 'cheapest', 'regret')
+
+
+class _InsertionEvaluator:
+    """Ocena wstawień na harmonogramach tras: dopuszczalność w O(1), koszt jako lokalna delta.
+
+    Wkład trasy w koszt: cpk·dystans + fixed + pen·nadmiar_horyzontu + tw·koniec_E.
+    """
+    __slots__ = ('inst', 'time_E', 'time_P', 'window_arrays', 'day_horizon', 'service_time',
+                 'ignore_all', 'cpk', 'pen', 'tw', 'dist', 'ws_min', 'svc', 'arc_ok')
+
+    def __init__(self, inst: VRPInstance, ignore_p_constraints: bool, ignore_all_constraints: bool):
+        self.inst = inst
+        self.time_E = inst.time_E
+        self.time_P = inst.time_E if ignore_p_constraints else inst.time_P
+        self.window_arrays = inst.window_arrays
+        self.day_horizon = inst.day_horizon
+        self.service_time = inst.service_time
+        self.ignore_all = ignore_all_constraints
+        self.cpk = inst.cost_per_km
+        self.pen = inst.penalty_horizon_per_min
+        self.tw = inst.time_weight
+        self.dist = inst.distance
+        self.ws_min = self.window_arrays[0]
+        self.svc = self.service_time if self.service_time > 0 else 0.0
+        self.arc_ok = None if ignore_all_constraints else inst.arc_compatible(ignore_p_constraints)
+
+    def schedule(self, route: List[int]):
+        return route_schedule(route, self.time_E, self.time_P, self.window_arrays, self.day_horizon,
+                              self.service_time)
+
+    def excess(self, end_E: float) -> float:
+        return end_E - self.day_horizon if end_E > self.day_horizon else 0.0
+
+    def end_after_insertion(self, sched, pos: int, client: int) -> float:
+        """Koniec trasy na osi E po wstawieniu `client` przed `pos`. Propagacja w przód
+        kończy się, gdy harmonogram zrówna się z dotychczasowym (reszta trasy bez zmian)."""
+        time_E = self.time_E
+        ws_min = self.ws_min
+        svc = self.svc
+        route = sched.route
+        start = sched.start
+        prev = route[pos-1]
+        t = max(start[pos-1] + time_E[prev, client], ws_min[client]) + svc
+        prev = client
+        for k in range(pos, len(route)):
+            b = route[k]
+            t = max(t + time_E[prev, b], ws_min[b])
+            if b != 0:
+                t += svc
+            if t == start[k]:
+                return start[-1]
+            prev = b
+        return t
+
+    def best_position(self, sched, client: int) -> Tuple[float, Optional[int]]:
+        """(delta, pos) najtańszego dopuszczalnego wstawienia `client` w trasę; (inf, None) gdy brak.
+        Przy remisie wygrywa wcześniejsza pozycja."""
+        route = sched.route
+        dist = self.dist
+        cpk, pen, tw = self.cpk, self.pen, self.tw
+        end_old = sched.start[-1]
+        exc_old = self.excess(end_old)
+        best_delta = float('inf')
+        best_pos = None
+        arc_ok = self.arc_ok
+        if arc_ok is not None:
+            ok_in = arc_ok[:, client]
+            ok_out = arc_ok[client]
+        for pos in range(1, len(route)):
+            p, q = route[pos-1], route[pos]
+            # Dopuszczalność: najpierw łuki p->client->q z macierzy zgodności,
+            # potem kontrola w O(1) z harmonogramu trasy
+            if arc_ok is not None and not (ok_in[p] and ok_out[q]):
+                continue
+            if not self.ignore_all and not insertion_feasible(
+                    sched, pos, client, self.time_E, self.time_P, self.window_arrays, self.day_horizon,
+                    self.service_time):
+                continue
+            end_new = self.end_after_insertion(sched, pos, client)
+            delta = (cpk * (dist[p, client] + dist[client, q] - dist[p, q])
+                     + pen * (self.excess(end_new) - exc_old) + tw * (end_new - end_old))
+            if delta < best_delta:
+                best_delta = delta
+                best_pos = pos
+        return best_delta, best_pos
+
+    def new_route_cost(self, client: int) -> float:
+        """Pełny wkład trasy [0, client, 0] (z kosztem pojazdu); inf gdy niedopuszczalna."""
+        route = [0, client, 0]
+        if not _local_feasible(route, self.time_E, self.time_P, self.window_arrays, self.day_horizon,
+                               self.service_time, self.ignore_all):
+            return float('inf')
+        return route_cost_contribution(route, self.inst)
 
 
 def greedy_insertion(
-    matrices: Dict[str, np.ndarray],
+    matrices: Union[Dict[str, np.ndarray], VRPInstance],
     time_windows: Optional[Dict[int, Optional[Tuple[datetime.time, datetime.time]]]] = None,
-    day_horizon: int = 600,
-    service_time: float = 0.0,
-    cost_per_km: float = 1.0,
-    vehicle_fixed_cost: float = 900.0,
-    penalty_horizon_per_min: float = 120.0,
+    day_horizon: Optional[int] = None,
+    service_time: Optional[float] = None,
+    cost_per_km: Optional[float] = None,
+    vehicle_fixed_cost: Optional[float] = None,
+    penalty_horizon_per_min: Optional[float] = None,
+    ignore_p_constraints: bool = False,
     ignore_all_constraints: bool = False,
+    rng: Optional[rd.Random] = None,
+    mode: str = 'random',
+    regret_k: int = 2,
         ) -> List[List[int]]:
-
-    time_E = matrices['expected']
-    time_P = matrices['pessimistic']
-    n = time_E.shape[0]
-    customers = list(range(1, n))
+    """`matrices` może być gotowym `VRPInstance` – wtedy jego okna zastępują `time_windows`,
+    a `day_horizon` / `service_time` / stałe kosztowe podane jawnie (nie None) nadpisują
+    parametry instancji (`as_instance`).
+    `ignore_p_constraints`: kontrola okien tylko na osi E (P sprawdzane tak jak E).
+    `rng`: własny generator (`random.Random`) – powtarzalna kolejność klientów;
+    domyślnie globalny moduł `random`.
+    `mode`: 'random' | 'cheapest' | 'regret' (z `regret_k`); dwa ostatnie są deterministyczne.
+    """
+    if mode not in INSERTION_MODES:
+        raise ValueError(f'Nieznany tryb wstawiania: {mode} (dozwolone: {INSERTION_MODES})')
+    inst = as_instance(
+        matrices, time_windows,
+        day_horizon=day_horizon,
+        service_time=service_time,
+        cost_per_km=cost_per_km,
+        vehicle_fixed_cost=vehicle_fixed_cost,
+        penalty_horizon_per_min=penalty_horizon_per_min,
+    )
+    ev = _InsertionEvaluator(inst, ignore_p_constraints, ignore_all_constraints)
+    customers = list(range(1, inst.n))
     if not customers:
         return [[0,0]]
+    if mode != 'random':
+        return _priority_insertion(ev, customers, regret_k if mode == 'regret' else 1)
 
     # Losowa kolejność klientów wprowadza element stochastyczny
-    rd.shuffle(customers)
+    (rng if rng is not None else rd).shuffle(customers)
     
     # Inicjalizacja: pierwsza trasa z losowym klientem
     first_customer = customers.pop()
     routes: List[List[int]] = [[0, first_customer, 0]]
-
-    def evaluate(solution: List[List[int]]) -> float:
-        """Funkcja pomocnicza do oceny kosztu danego rozwiązania."""
-        cost, _ = calculate_vrp_cost_local_robust(
-            solution, matrices, time_windows,
-            day_horizon=day_horizon,
-            service_time=service_time,
-            cost_per_km=cost_per_km,
-            vehicle_fixed_cost=vehicle_fixed_cost,
-            penalty_horizon_per_min=penalty_horizon_per_min,
-        )
-        return cost
+    schedules = [ev.schedule(r) for r in routes]
 
     while customers:
         client_to_insert = customers.pop()
-        best_insertion_cost = float('inf')
-        best_solution_after_insertion = None
+        best_delta = float('inf')
+        best_r_idx = None
+        best_pos = None
         
-        # Krok 1: Znajdź najlepsze miejsce wstawienia w istniejących trasach
-        for r_idx, route in enumerate(routes):
-            for pos in range(1, len(route)):
-                # Utwórz kandydacką trasę przez wstawienie klienta
-                new_route = route[:pos] + [client_to_insert] + route[pos:]
-                
-                # Sprawdź dopuszczalność tylko zmodyfikowanej trasy
-                if not route_feasible_ep(new_route, time_E, time_P, time_windows, day_horizon, service_time):
-                    continue
-                
-                # Oceń koszt całego nowego rozwiązania
-                candidate_solution = routes[:r_idx] + [new_route] + routes[r_idx+1:]
-                new_cost = evaluate(candidate_solution)
-
-                if new_cost < best_insertion_cost:
-                    best_insertion_cost = new_cost
-                    best_solution_after_insertion = candidate_solution
-
-        # Krok 2: Rozważ utworzenie nowej trasy dla klienta
-        new_route_for_client = [0, client_to_insert, 0]
-        if route_feasible_ep(new_route_for_client, time_E, time_P, time_windows, day_horizon, service_time):
-            candidate_solution = routes + [new_route_for_client]
-            new_cost = evaluate(candidate_solution)
-            
-            if new_cost < best_insertion_cost:
-                best_insertion_cost = new_cost
-                best_solution_after_insertion = candidate_solution
-
-        # Krok 3: Zaktualizuj rozwiązanie
-        if best_solution_after_insertion is not None:
-            routes = best_solution_after_insertion
+        # Krok 1: Znajdź najlepsze miejsce wstawienia w istniejących trasach.
+        # Oceniamy tylko przyrost kosztu zmienianej trasy (dystans, czas, horyzont) –
+        # bez budowania kandydackich tras i bez pełnej funkcji kosztu.
+        for r_idx, sched in enumerate(schedules):
+            delta, pos = ev.best_position(sched, client_to_insert)
+            if delta < best_delta:
+                best_delta = delta
+                best_r_idx = r_idx
+                best_pos = pos
+
+        # Krok 2: Rozważ utworzenie nowej trasy dla klienta (pełny wkład trasy, w tym koszt pojazdu)
+        delta = ev.new_route_cost(client_to_insert)
+        if delta < best_delta:
+            best_delta = delta
+            best_r_idx = len(routes)
+            best_pos = None
+
+        # Krok 3: Zastosuj wybrane wstawienie (i harmonogram tylko zmienionej trasy)
+        if best_r_idx is not None and best_pos is not None:
+            route = routes[best_r_idx]
+            route.insert(best_pos, client_to_insert)
+            schedules[best_r_idx] = ev.schedule(route)
         else:
-            # Jeśli nigdzie nie dało się wstawić klienta (bardzo restrykcyjne okna),
-            # dodaj go w osobnej, potencjalnie niedopuszczalnej trasie.
-            # Taki przypadek jest mało prawdopodobny przy poprawnych danych.
+            # Nowa trasa – wybrana albo (gdy nigdzie nie dało się wstawić klienta, bardzo
+            # restrykcyjne okna) jako osobna, potencjalnie niedopuszczalna trasa.
             routes.append([0, client_to_insert, 0])
+            schedules.append(ev.schedule(routes[-1]))
+
+    return routes
+
+
+def _priority_insertion(ev: _InsertionEvaluator, customers: List[int], k: int) -> List[List[int]]:
+    """Cheapest (k=1) / regret-k insertion z leniwym kopcem.
+
+    `options[c]` – {indeks trasy: (delta, pos)} najlepszego wstawienia c w każdej trasie.
+    Priorytet klienta: k=1 – (najtańsza opcja, c); k≥2 – (m, -żal_m, najtańsza opcja, c), gdzie
+    m = min(liczba dopuszczalnych opcji, k) – klienci z mniejszą liczbą opcji idą pierwsi –
+    a żal_m = Σ_{h<m} (c_h - c_1). Nowa trasa jest zawsze dodatkową opcją.
+    Wpis kopca jest aktualny tylko z bieżącą wersją klienta.
+    """
+    inf = float('inf')
+    routes: List[List[int]] = []
+    schedules = []
+    new_cost = {c: ev.new_route_cost(c) for c in customers}
+    options: Dict[int, Dict[int, Tuple[float, Optional[int]]]] = {c: {} for c in customers}
+    version = {c: 0 for c in customers}
+    heap: List[tuple] = []
+
+    def priority(c: int) -> tuple:
+        costs = sorted([d for d, _ in options[c].values() if d < inf] + ([new_cost[c]] if new_cost[c] < inf else []))
+        best = costs[0] if costs else inf
+        if k <= 1:
+            return (best, c)
+        # Mniej niż k opcji = pilniej (najpierw klienci z najmniejszą liczbą opcji),
+        # w obrębie grupy żal liczony po dostępnych opcjach
+        m = min(len(costs), k)
+        regret = sum(costs[h] - best for h in range(1, m))
+        return (m, -regret, best, c)
+
+    current: Dict[int, tuple] = {}
+
+    def push(c: int):
+        pr = priority(c)
+        if current.get(c) == pr:
+            return  # priorytet bez zmian – wpis w kopcu nadal aktualny
+        current[c] = pr
+        version[c] += 1
+        heapq.heappush(heap, (pr, version[c], c))
+
+    for c in customers:
+        push(c)
+    unrouted = set(customers)
+
+    while unrouted:
+        _, ver, c = heapq.heappop(heap)
+        if c not in unrouted or ver != version[c]:
+            continue  # nieaktualny wpis (klient obsłużony albo przeliczony)
+        unrouted.discard(c)
+        # Najtańsza opcja klienta: trasa (remis – niższy indeks trasy) albo nowa trasa
+        best_r, best_delta, best_pos = None, inf, None
+        for r_idx in sorted(options[c]):
+            delta, pos = options[c][r_idx]
+            if delta < best_delta:
+                best_r, best_delta, best_pos = r_idx, delta, pos
+        if best_r is not None and best_pos is not None and not new_cost[c] < best_delta:
+            routes[best_r].insert(best_pos, c)
+            schedules[best_r] = ev.schedule(routes[best_r])
+            changed = best_r
+        else:
+            # Nowa trasa – wybrana albo jedyna możliwość (potencjalnie niedopuszczalna)
+            routes.append([0, c, 0])
+            schedules.append(ev.schedule(routes[-1]))
+            changed = len(routes) - 1
+        # Przelicz wstawienia pozostałych klientów tylko w zmienionej trasie
+        sched = schedules[changed]
+        for u in unrouted:
+            options[u][changed] = ev.best_position(sched, u)
+            push(u)
 
     return routes
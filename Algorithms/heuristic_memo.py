@@ -0,0 +1,75 @@
+"""Memoizacja deterministycznych konstruktorów (np. Clarke–Wright Savings).
+
+Wynik (trasy) zależy tylko od instancji i parametrów konstruktora, więc liczymy go raz:
+klucz = SHA-1(odcisk `VRPInstance.fingerprint()` + nazwa algorytmu + parametry + wersja).
+Dwa poziomy:
+ - pamięć procesu (kolejne wywołania w tym samym procesie),
+ - opcjonalnie katalog na dysku (`memo_dir`, zwykle `.heuristics_cache/` obok eksportów
+   routes_*.json) – plik `<algorytm>_<klucz>.json`, zapisywany atomowo, współdzielony
+   przez kolejne uruchomienia batchy.
+Koszt i metryki nie są zapisywane – liczy je wywołujący z tras (tanio i zawsze spójnie
+z bieżącą funkcją kosztu).
+"""
+from __future__ import annotations
+import hashlib
+import json
+import os
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .vrp_instance import VRPInstance
+
+__all__ = ["memoized_construction", "memo_key", "MEMO_DIRNAME"]
+
+MEMO_VERSION = 1
+MEMO_DIRNAME = '.heuristics_cache'
+
+_MEMORY: Dict[str, List[List[int]]] = {}
+
+
+def memo_key(algorithm: str, inst: VRPInstance, params: Dict) -> str:
+    payload = json.dumps({'v': MEMO_VERSION, 'algorithm': algorithm, 'instance': inst.fingerprint(),
+                          'params': params}, sort_keys=True)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def _read(path: str, key: str) -> Optional[List[List[int]]]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get('version') != MEMO_VERSION or data.get('key') != key:
+        return None
+    return data.get('routes')
+
+
+def _write(path: str, key: str, algorithm: str, params: Dict, routes: List[List[int]]) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'version': MEMO_VERSION, 'key': key, 'algorithm': algorithm,
+                   'params': params, 'routes': routes}, f)
+    os.replace(tmp, path)
+
+
+def memoized_construction(algorithm: str, constructor: Callable[..., List[List[int]]], inst: VRPInstance,
+                          memo_dir: Optional[str] = None, **params) -> Tuple[List[List[int]], str]:
+    """Trasy z `constructor(inst, **params)` – z pamięci, z dysku lub policzone i zapisane.
+
+    Zwraca (routes, źródło) gdzie źródło ∈ {'memory', 'disk', 'computed'}.
+    Zwracana jest kopia tras, więc wywołujący może je modyfikować.
+    """
+    key = memo_key(algorithm, inst, params)
+    routes = _MEMORY.get(key)
+    source = 'memory'
+    path = os.path.join(memo_dir, f'{algorithm}_{key}.json') if memo_dir else None
+    if routes is None and path and os.path.isfile(path):
+        routes = _read(path, key)
+        source = 'disk'
+    if routes is None:
+        routes = constructor(inst, **params)
+        source = 'computed'
+        if path:
+            _write(path, key, algorithm, params, routes)
+    _MEMORY[key] = routes
+    return [r[:] for r in routes], source
@@ -1,5 +1,6 @@
 """Clarke-Wright Savings Heuristic
-Łączenie tras na podstawie oszczędności: sij = t_{0,i}^E + t_{0,j}^E - t_{i,j}^E.
+Łączenie tras na podstawie oszczędności: sij = t_{0,i}^E + t_{0,j}^E - t_{i,j}^E
+(opcjonalnie uogólnionych: - λ·t_{i,j}^E + μ·|t_{0,i}^E - t_{0,j}^E|, przegląd (λ, μ) w `savings_sweep`).
 
 Dualny filtr okien (E/P): propagujemy tylko expected.
     A_b^E = B_a^E + t_{ab}^E
@@ -8,27 +9,121 @@ Akceptacja merge gdy dla każdego b: B_b^E ≤ b_b oraz (jeśli kontrolujemy P)
 """
 
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple, Union
 import numpy as np
 from .common_feasibility import route_feasible_ep
+from .vrp_instance import VRPInstance, as_instance
+
+
+# Rozmiar bloku wierszy przy liczeniu oszczędności w trybie k-NN (~1M elementów na blok)
+_BLOCK_ELEMS = 1 << 20
+
+
+def _pairs_sorted(s: np.ndarray, i: np.ndarray, j: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Kolejność jak `sorted([(s, i, j), ...], reverse=True)`: malejąco po s, potem i, potem j."""
+    order = np.lexsort((-j, -i, -s))
+    return i[order], j[order]
+
+
+def _combine(base, dist, asym, lam: float, mu: float):
+    """s = base - λ·dist + μ·asym; dla (1, 0) dokładnie klasyczne t_0i + t_0j - t_ij."""
+    s = base - dist if lam == 1.0 else base - lam * dist
+    if mu:
+        s = s + mu * asym
+    return s
+
+
+def savings_terms(time_E: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Składniki oszczędności uogólnionych dla klientów 1..n-1 (macierze (n-1)×(n-1)):
+    (t_0i + t_0j, t_ij, |t_0i - t_0j|). Liczone raz i współdzielone przez przegląd (λ, μ)."""
+    t0 = time_E[0, 1:]
+    return t0[:, None] + t0[None, :], time_E[1:, 1:], np.abs(t0[:, None] - t0[None, :])
+
+
+def savings_order(time_E: np.ndarray, neighbors: Optional[int] = None, lam: float = 1.0, mu: float = 0.0,
+                  terms: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+                  ) -> Tuple[np.ndarray, np.ndarray]:
+    """Pary (i, j) klientów z dodatnią oszczędnością, malejąco po s_ij.
+
+    Oszczędność uogólniona: s_ij = t_0i + t_0j - λ·t_ij + μ·|t_0i - t_0j|
+    (λ – kształt tras, μ – asymetria odległości od depotu; (1, 0) to klasyczne Clarke–Wright).
+    Bez `neighbors`: pełna macierz oszczędności (broadcasting NumPy, albo gotowe `terms`
+    z `savings_terms`), O(n^2).
+    Z `neighbors=k`: dla każdego klienta k największych oszczędności jako poprzednik (wiersz)
+    i k jako następnik (kolumna), liczone blokami – pamięć i sortowanie O(n·k).
+    Remisy rozstrzygane jak przy sortowaniu krotek (s, i, j) malejąco.
+    """
+    n = time_E.shape[0]
+    if n <= 2:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+    t0 = time_E[0, 1:]
+    if neighbors is None or neighbors >= n - 2:
+        s = _combine(*(terms if terms is not None else savings_terms(time_E)), lam, mu)
+        np.fill_diagonal(s, -np.inf)
+        i, j = np.nonzero(s > 0)
+        return _pairs_sorted(s[i, j], i + 1, j + 1)
+
+    k = max(int(neighbors), 1)
+    m = n - 1
+    block = max(1, _BLOCK_ELEMS // m)
+    keys = []
+    for transpose in (False, True):
+        for start in range(0, m, block):
+            stop = min(start + block, m)
+            rows = np.arange(start, stop)
+            if not transpose:
+                # s[i, :] dla i w bloku – najlepsi następnicy j klienta i
+                a0, b0 = t0[start:stop, None], t0[None, :]
+                s = _combine(a0 + b0, time_E[start + 1:stop + 1, 1:], np.abs(a0 - b0), lam, mu)
+            else:
+                # s[:, j] dla j w bloku (transponowane) – najlepsi poprzednicy i klienta j
+                a0, b0 = t0[:, None], t0[None, start:stop]
+                s = _combine(a0 + b0, time_E[1:, start + 1:stop + 1], np.abs(a0 - b0), lam, mu).T
+            s[rows - start, rows] = -np.inf
+            top = np.argpartition(-s, k - 1, axis=1)[:, :k]
+            vals = np.take_along_axis(s, top, axis=1)
+            r, c = np.nonzero(vals > 0)
+            a = rows[r] + 1
+            b = top[r, c] + 1
+            keys.append(a * n + b if not transpose else b * n + a)
+    key = np.unique(np.concatenate(keys)) if keys else np.empty(0, dtype=np.int64)
+    i, j = np.divmod(key, n)
+    s = _combine(time_E[0, i] + time_E[0, j], time_E[i, j], np.abs(time_E[0, i] - time_E[0, j]), lam, mu)
+    return _pairs_sorted(s, i, j)
 
 
 def clarke_wright_savings(
-    matrices: Dict[str, np.ndarray],
+    matrices: Union[Dict[str, np.ndarray], VRPInstance],
     time_windows: Optional[Dict[int, Optional[Tuple[datetime.time, datetime.time]]]] = None,
-    day_horizon: int = 600,
-    service_time: float = 0.0,
+    day_horizon: Optional[int] = None,
+    service_time: Optional[float] = None,
+    ignore_p_constraints: bool = False,
     ignore_all_constraints: bool = False,
+    neighbors: Optional[int] = None,
+    lam: float = 1.0,
+    mu: float = 0.0,
+    terms: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None,
 ) -> List[List[int]]:
     """Implementacja heurystyki oszczędności Clarke'a-Wrighta.
 
     Algorytm startuje z trywialnego rozwiązania (każdy klient ma osobną trasę),
     a następnie iteracyjnie łączy trasy na podstawie "oszczędności" w koszcie,
     pod warunkiem zachowania dopuszczalności czasowej.
+
+    `matrices` może być gotowym `VRPInstance` (jego okna; `day_horizon` / `service_time` podane
+    jawnie nadpisują parametry instancji, None – domyślne lub z instancji). `ignore_p_constraints`: okna kontrolowane tylko na osi E.
+    `neighbors`: tryb k-NN – tylko k największych oszczędności na klienta (patrz `savings_order`).
+    `lam`, `mu`: oszczędności uogólnione s_ij = t_0i + t_0j - λ·t_ij + μ·|t_0i - t_0j|;
+    `terms`: gotowe składniki z `savings_terms` (przegląd parametrów liczy je raz).
     """
-    time_E = matrices['expected']
-    time_P = matrices['pessimistic']
-    n_locations = time_E.shape[0]
+    inst = as_instance(matrices, time_windows, day_horizon=day_horizon, service_time=service_time)
+    time_E = inst.time_E
+    time_P = inst.time_E if ignore_p_constraints else inst.time_P
+    day_horizon = inst.day_horizon
+    service_time = inst.service_time
+    window_arrays = inst.window_arrays
+    n_locations = inst.n
     if n_locations <= 1:
         return [[0, 0]]
 
@@ -36,35 +131,28 @@ def clarke_wright_savings(
     # Inicjalizacja: każdemu klientowi przypisana jest osobna trasa [0, klient, 0]
     routes = {c: [0, c, 0] for c in customers}
 
-    # Oblicz oszczędności dla wszystkich par klientów (i, j)
-    # Oszczędność sij = d(0,i) + d(0,j) - d(i,j)
-    savings = []
-    for i in customers:
-        for j in customers:
-            if i != j:
-                # Używamy czasu oczekiwanego (E) jako metryki do obliczania oszczędności
-                s_ij = time_E[0, i] + time_E[0, j] - time_E[i, j]
-                if s_ij > 0:
-                    savings.append((s_ij, i, j))
-    
-    # Sortuj oszczędności malejąco, aby najpierw rozważać najbardziej obiecujące połączenia
-    savings.sort(reverse=True)
-
-    def find_route_with_endpoint(node: int, start_of_route: bool) -> Optional[int]:
-        """Znajdź klucz trasy, która zaczyna/kończy się danym węzłem."""
-        for key, r in routes.items():
-            if len(r) > 2:
-                if start_of_route and r[1] == node:
-                    return key
-                if not start_of_route and r[-2] == node:
-                    return key
-        return None
-
-    for s, i, j in savings:
+    # Lista oszczędności (i, j) uporządkowana malejąco – najpierw najbardziej obiecujące połączenia
+    pairs_i, pairs_j = savings_order(time_E, neighbors=neighbors, lam=lam, mu=mu, terms=terms)
+    if not ignore_all_constraints and len(pairs_i):
+        # Połączenie (i, j) tworzy łuk i->j – pary z łukiem niezgodnym z oknami nigdy nie przejdą
+        # kontroli dopuszczalności, więc odrzucamy je przed pętlą (wynik bez zmian)
+        keep = inst.arc_compatible(ignore_p_constraints)[pairs_i, pairs_j]
+        pairs_i, pairs_j = pairs_i[keep], pairs_j[keep]
+
+    # Indeks końców tras: head_of[c] / tail_of[c] = klucz trasy, której pierwszym / ostatnim
+    # klientem jest c (None gdy c jest wewnątrz trasy). Każdy klient należy do jednej trasy,
+    # więc sprawdzenie warunków merge jest O(1), a indeks aktualizujemy przy każdym połączeniu.
+    head_of: List[Optional[int]] = [None] * n_locations
+    tail_of: List[Optional[int]] = [None] * n_locations
+    for c in customers:
+        head_of[c] = c
+        tail_of[c] = c
+
+    for i, j in zip(pairs_i.tolist(), pairs_j.tolist()):
         # Warunek 1: i musi być ostatnim klientem na swojej trasie
-        route_i_key = find_route_with_endpoint(i, start_of_route=False)
+        route_i_key = tail_of[i]
         # Warunek 2: j musi być pierwszym klientem na swojej trasie
-        route_j_key = find_route_with_endpoint(j, start_of_route=True)
+        route_j_key = head_of[j]
 
         # Jeśli oba warunki są spełnione i trasy są różne, można je połączyć
         if route_i_key is not None and route_j_key is not None and route_i_key != route_j_key:
@@ -75,9 +163,14 @@ def clarke_wright_savings(
             merged_route = route_i[:-1] + route_j[1:]
 
             # Sprawdź, czy połączona trasa jest dopuszczalna
-            if ignore_all_constraints or route_feasible_ep(merged_route, time_E, time_P, time_windows, day_horizon, service_time):
+            if ignore_all_constraints or route_feasible_ep(merged_route, time_E, time_P, None, day_horizon,
+                                                           service_time, window_arrays=window_arrays):
                 # Jeśli tak, zaktualizuj zbiór tras
                 routes[route_i_key] = merged_route
                 del routes[route_j_key]
+                # i przestaje być końcem, j początkiem; koniec trasy j staje się końcem połączonej
+                tail_of[i] = None
+                head_of[j] = None
+                tail_of[route_j[-2]] = route_i_key
 
     return list(routes.values())
@@ -0,0 +1,128 @@
+"""Multi-start Greedy Insertion: R niezależnych konstrukcji w puli procesów.
+
+Każdy run r dostaje własny strumień `random.Random` wyprowadzony z jednego ziarna
+głównego (`numpy.random.SeedSequence(seed).spawn(R)[r]`), więc wynik nie zależy od
+liczby workerów ani kolejności ich ukończenia, a cały eksperyment odtwarza się
+z `seed` (dla `seed=None` entropia jest zwracana w wyniku).
+Opcjonalne wczesne zatrzymanie: `target_cost` (koszt ≤ celu) lub `time_budget` (sekundy);
+runy jeszcze nierozpoczęte są wtedy anulowane.
+"""
+from __future__ import annotations
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed, FIRST_COMPLETED, wait
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+from .heuristic_insertion import greedy_insertion
+from .robust_cost import calculate_vrp_cost_local_robust
+from .vrp_instance import VRPInstance, as_instance
+
+__all__ = ["multistart_greedy", "run_seeds"]
+
+_WORKER_INSTANCE: Optional[VRPInstance] = None
+
+
+def _init_worker(inst: VRPInstance):
+    global _WORKER_INSTANCE
+    _WORKER_INSTANCE = inst
+
+
+def run_seeds(runs: int, seed: Optional[int] = None):
+    """(entropia, lista ziaren int) – niezależne strumienie dla `runs` konstrukcji."""
+    seq = np.random.SeedSequence(seed)
+    seeds = [int(child.generate_state(1, np.uint64)[0]) for child in seq.spawn(runs)]
+    return seq.entropy, seeds
+
+
+def _greedy_run(inst: VRPInstance, index: int, run_seed: int, heur_kwargs: Dict) -> Dict:
+    routes = greedy_insertion(inst, rng=random.Random(run_seed), **heur_kwargs)
+    # Metryki potrzebne są tylko dla zwycięzcy – runy liczą sam koszt
+    cost = calculate_vrp_cost_local_robust(routes, inst, with_metrics=False)
+    return {'run_index': index + 1, 'seed': run_seed, 'cost': cost, 'routes': routes, 'metrics': None}
+
+
+def _greedy_run_worker(index: int, run_seed: int, heur_kwargs: Dict) -> Dict:
+    return _greedy_run(_WORKER_INSTANCE, index, run_seed, heur_kwargs)
+
+
+def multistart_greedy(matrices: Union[Dict[str, np.ndarray], VRPInstance], runs: int = 20,
+                      time_windows=None, seed: Optional[int] = None, workers: Optional[int] = 1,
+                      target_cost: Optional[float] = None, time_budget: Optional[float] = None,
+                      ignore_p_constraints: bool = False, ignore_all_constraints: bool = False,
+                      mode: str = 'random', regret_k: int = 2, **instance_params) -> Dict:
+    """Uruchom `runs` konstrukcji Greedy Insertion (`workers` procesów; None = liczba CPU).
+
+    `mode` / `regret_k` jak w `greedy_insertion`; tryby 'cheapest' / 'regret' są
+    deterministyczne, więc dla nich wystarcza `runs=1`.
+
+    Zwraca słownik:
+      best            – wynik najlepszego runu {'run_index', 'seed', 'cost', 'routes', 'metrics'}
+                        (remis: niższy run_index),
+      results         – lista wyników w kolejności runów (None dla runów anulowanych;
+                        'metrics' wypełnione tylko w zwycięskim runie),
+      costs           – rozkład kosztów ukończonych runów (w kolejności runów),
+      runs_done, stopped ('target' | 'time' | None), seed_entropy, runtime_seconds.
+    """
+    if runs < 1:
+        raise ValueError('runs musi być >= 1')
+    inst = as_instance(matrices, time_windows, **instance_params)
+    entropy, seeds = run_seeds(runs, seed)
+    heur_kwargs = {'ignore_p_constraints': ignore_p_constraints,
+                   'ignore_all_constraints': ignore_all_constraints,
+                   'mode': mode, 'regret_k': regret_k}
+    results: List[Optional[Dict]] = [None] * runs
+    stopped = None
+    start = time.time()
+
+    def should_stop(res: Dict) -> Optional[str]:
+        if target_cost is not None and res['cost'] <= target_cost:
+            return 'target'
+        if time_budget is not None and time.time() - start >= time_budget:
+            return 'time'
+        return None
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or runs == 1:
+        for i, run_seed in enumerate(seeds):
+            res = results[i] = _greedy_run(inst, i, run_seed, heur_kwargs)
+            stopped = should_stop(res)
+            if stopped:
+                break
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, runs), initializer=_init_worker,
+                                 initargs=(inst,)) as pool:
+            pending = {pool.submit(_greedy_run_worker, i, s, heur_kwargs) for i, s in enumerate(seeds)}
+            while pending and not stopped:
+                timeout = None
+                if time_budget is not None:
+                    timeout = max(0.0, time_budget - (time.time() - start))
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    stopped = 'time'
+                for fut in done:
+                    res = fut.result()
+                    results[res['run_index'] - 1] = res
+                    stopped = stopped or should_stop(res)
+            for fut in pending:
+                fut.cancel()
+            # runy już rozpoczęte kończą się przy zamknięciu puli – ich wyniki też zachowujemy
+            for fut in as_completed(f for f in pending if not f.cancelled()):
+                res = fut.result()
+                results[res['run_index'] - 1] = res
+
+    finished = [r for r in results if r is not None]
+    best = min(finished, key=lambda r: (r['cost'], r['run_index']))
+    _, best['metrics'] = calculate_vrp_cost_local_robust(best['routes'], inst)
+    return {
+        'best': best,
+        'results': results,
+        'costs': [r['cost'] for r in finished],
+        'runs_done': len(finished),
+        'stopped': stopped,
+        'seed_entropy': entropy,
+        'runtime_seconds': time.time() - start,
+    }
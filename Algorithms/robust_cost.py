@@ -1,13 +1,76 @@
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple, Union
 from datetime import datetime
 import numpy as np
 
+from .common_feasibility import WindowArrays, build_window_arrays
+from .vrp_instance import VRPInstance
+
 def count_used_vehicles(vrp_solution: List[List[int]]) -> int:
     return sum(1 for r in vrp_solution if len(r) > 2)
 
+def route_cost_components(route: List[int], inst: VRPInstance) -> Tuple[float, float]:
+    """(dystans, koniec trasy na osi E) dla jednej trasy – ta sama propagacja co w
+    `calculate_vrp_cost_local_robust`. Trasa pusta ([0, 0]) -> (0.0, 0.0)."""
+    if len(route) <= 2:
+        return 0.0, 0.0
+    time_E = inst.time_E
+    dist_matrix = inst.distance
+    ws_min = inst.window_start_min
+    service = inst.service_time if inst.service_time > 0 else 0.0
+    timeline_E = 0.0
+    route_dist = 0.0
+    for i in range(len(route) - 1):
+        a = route[i]; b = route[i+1]
+        route_dist += dist_matrix[a, b]
+        timeline_E = max(timeline_E + time_E[a, b], ws_min[b])
+        if b != 0:
+            timeline_E += service
+    return route_dist, timeline_E
+
+def route_cost_contribution(route: List[int], inst: VRPInstance) -> float:
+    """Wkład jednej trasy w koszt całkowity (dystans, pojazd, kara horyzontu, czas).
+
+    Suma wkładów wszystkich tras = koszt `calculate_vrp_cost_local_robust` (z dokładnością
+    do kolejności sumowania float) – pozwala liczyć deltę ruchu tylko na zmienionych trasach.
+    """
+    if len(route) <= 2:
+        return 0.0
+    dist, end_E = route_cost_components(route, inst)
+    excess = end_E - inst.day_horizon if end_E > inst.day_horizon else 0.0
+    return (inst.cost_per_km * dist + inst.vehicle_fixed_cost
+            + inst.penalty_horizon_per_min * excess + inst.time_weight * end_E)
+
+def _cost_only(vrp_solution: List[List[int]], time_E: np.ndarray, dist_matrix: Optional[np.ndarray],
+               ws_min: np.ndarray, day_horizon: float, service_time: float, cost_per_km: float,
+               vehicle_fixed_cost: float, penalty_horizon_per_min: float, time_weight: float) -> float:
+    """Koszt bez metryk – te same akumulatory i ta sama kolejność działań co pełna wersja."""
+    total_distance_km = 0.0
+    horizon_excess = 0.0
+    sum_route_time_E = 0.0
+    k_used = 0
+    add_service = service_time > 0
+    for route in vrp_solution:
+        if len(route) <= 2:
+            continue
+        k_used += 1
+        timeline_E = 0.0
+        for i in range(len(route) - 1):
+            a = route[i]; b = route[i+1]
+            travel_E = time_E[a, b]
+            total_distance_km += dist_matrix[a, b] if dist_matrix is not None else travel_E
+            timeline_E = max(timeline_E + travel_E, ws_min[b])
+            if b != 0 and add_service:
+                timeline_E += service_time
+        sum_route_time_E += timeline_E
+        if timeline_E > day_horizon:
+            horizon_excess += (timeline_E - day_horizon)
+    total_cost = cost_per_km * total_distance_km + vehicle_fixed_cost * k_used + penalty_horizon_per_min * horizon_excess
+    total_cost += time_weight * sum_route_time_E
+    return total_cost
+
 def calculate_vrp_cost_local_robust(
     vrp_solution: List[List[int]],
-    matrices: Dict[str, np.ndarray],
+    matrices: Union[Dict[str, np.ndarray], VRPInstance],
     time_windows: Optional[Dict[int, Optional[Tuple[datetime.time, datetime.time]]]] = None,
     day_horizon: int = 600,
     service_time: float = 0.0,
@@ -16,6 +79,8 @@ def calculate_vrp_cost_local_robust(
     vehicle_fixed_cost: float = 900.0,
     penalty_horizon_per_min: float = 120.0,
     time_weight: float = 1.0,
+    window_arrays: Optional[WindowArrays] = None,
+    with_metrics: bool = True,
 ):
     """Nowa funkcja kosztu (literatura VRPTW).
 
@@ -29,10 +94,32 @@ def calculate_vrp_cost_local_robust(
     - Lateness liczone na osi pesymistycznej względem końca okna.
     - Przekroczenie horyzontu (horizon_excess) liczone na osi expected.
     - service_time doklejany po przybyciu (po ewentualnym czekaniu) jeśli b != 0.
+    - `window_arrays` (z `build_window_arrays`) – prekompilowane okna; bez nich budujemy je raz na wywołanie.
+    - Składnik czasu: time_weight * suma czasów zakończenia tras (oś E).
+    - `matrices` może być `VRPInstance` – wtedy okna i wszystkie parametry kosztu pochodzą z instancji.
+    - `with_metrics=False` – ścieżka tylko-koszt: zwraca sam float (bitowo równy kosztowi z pełnej
+      wersji), bez osi P, list per trasa i słownika metryk.
     """
-    time_E = matrices['expected']
-    time_P = matrices['pessimistic']
-    dist_matrix = matrices.get('distance_km', None)
+    if isinstance(matrices, VRPInstance):
+        inst = matrices
+        time_E, time_P, dist_matrix = inst.time_E, inst.time_P, inst.distance
+        window_arrays = inst.window_arrays
+        day_horizon = inst.day_horizon
+        service_time = inst.service_time
+        cost_per_km = inst.cost_per_km
+        vehicle_fixed_cost = inst.vehicle_fixed_cost
+        penalty_horizon_per_min = inst.penalty_horizon_per_min
+        time_weight = inst.time_weight
+    else:
+        time_E = matrices['expected']
+        time_P = matrices['pessimistic']
+        dist_matrix = matrices.get('distance_km', None)
+
+    if window_arrays is None:
+        window_arrays = build_window_arrays(time_windows, time_E.shape[0])
+    if not with_metrics:
+        return _cost_only(vrp_solution, time_E, dist_matrix, window_arrays[0], day_horizon, service_time,
+                          cost_per_km, vehicle_fixed_cost, penalty_horizon_per_min, time_weight)
 
     total_distance_km = 0.0
     total_wait_E = 0.0  # tylko diagnostyka
@@ -44,8 +131,10 @@ def calculate_vrp_cost_local_robust(
     route_end_times_P: List[float] = []
     route_waiting_E_list: List[float] = []
     route_distance_list: List[float] = []
+    sum_route_time_E = 0.0
+    visits = 0
 
-    base_dt = datetime.strptime("08:00", "%H:%M")
+    ws_min, we_min = window_arrays
 
     for route in vrp_solution:
         if len(route) <= 2:
@@ -70,41 +159,31 @@ def calculate_vrp_cost_local_robust(
             arrival_E = timeline_E + travel_E
             arrival_P = timeline_P + travel_P
 
-            if time_windows and b in time_windows and time_windows[b]:
-                ws, we = time_windows[b]
-                ws_minutes = (datetime.combine(base_dt.date(), ws) - base_dt).seconds / 60
-                we_minutes = (datetime.combine(base_dt.date(), we) - base_dt).seconds / 60
-
-                if arrival_E < ws_minutes:
-                    wait_E = ws_minutes - arrival_E
-                else:
-                    wait_E = 0.0
-                total_wait_E += wait_E
-                route_wait_E += wait_E
-
-                # Brak obliczania lateness – naruszenia P odrzucane wcześniej
-
-                start_service_E = max(arrival_E, ws_minutes)
-                start_service_P = max(arrival_P, ws_minutes)
-                if b != 0 and service_time > 0:
-                    start_service_E += service_time
-                    start_service_P += service_time
-                timeline_E = start_service_E
-                timeline_P = start_service_P
+            # Węzły bez okna mają granice (-inf, +inf): brak czekania, start = przyjazd
+            ws_minutes = ws_min[b]
+            if arrival_E < ws_minutes:
+                wait_E = ws_minutes - arrival_E
             else:
-                if b != 0 and service_time > 0:
-                    arrival_E_with_service = arrival_E + service_time
-                    arrival_P_with_service = arrival_P + service_time
-                else:
-                    arrival_E_with_service = arrival_E
-                    arrival_P_with_service = arrival_P
-                timeline_E = arrival_E_with_service
-                timeline_P = arrival_P_with_service
+                wait_E = 0.0
+            total_wait_E += wait_E
+            route_wait_E += wait_E
+
+            # Brak obliczania lateness – naruszenia P odrzucane wcześniej
+
+            start_service_E = max(arrival_E, ws_minutes)
+            start_service_P = max(arrival_P, ws_minutes)
+            if b != 0 and service_time > 0:
+                start_service_E += service_time
+                start_service_P += service_time
+            timeline_E = start_service_E
+            timeline_P = start_service_P
 
         route_end_times_E.append(timeline_E)
         route_end_times_P.append(timeline_P)
         route_waiting_E_list.append(route_wait_E)
         route_distance_list.append(route_dist)
+        sum_route_time_E += timeline_E
+        visits += len(route) - 2
         if timeline_E > day_horizon:
             horizon_excess += (timeline_E - day_horizon)
 
@@ -113,7 +192,10 @@ def calculate_vrp_cost_local_robust(
 
     cost_distance = cost_per_km * total_distance_km
     cost_horizon = penalty_horizon_per_min * horizon_excess
-    # Suma czasów zakończenia tras (proxy wysiłku floty) jest obliczona poniżej jako sum_route_time_E.
+    total_cost = cost_distance + vehicle_cost + cost_horizon
+    avg_route_time_E = sum_route_time_E / len(route_end_times_E) if route_end_times_E else 0.0
+    total_service_time = service_time * visits
+    # Suma czasów zakończenia tras (proxy wysiłku floty) jest akumulowana w pętli jako sum_route_time_E.
     # Waga `time_weight` umożliwia włączenie/wyłączenie wpływu sumy czasów zakończenia tras
     # na funkcję celu. Domyślnie (1.0) jest to aktywny składnik kosztu.
     cost_time = time_weight * sum_route_time_E
@@ -0,0 +1,74 @@
+"""Ograniczony cache LRU wyników per trasa (klucz: krotka węzłów trasy).
+
+SA z sąsiedztwem `mixed` wielokrotnie proponuje trasy już ocenione (2-opt odwrócony
+i przywrócony, relocate i ruch odwrotny). Cache przechowuje dla trasy:
+ - klasyfikację dopuszczalności (`route_feasible_ep_classified`: ok, vio_E, vio_P, vio_both),
+ - wkład w koszt (`route_cost_contribution`).
+Obie wartości liczone są leniwie; liczniki hits/misses dotyczą pojedynczych wartości.
+Cache jest związany z jedną instancją (`VRPInstance`) – wyniki zależą od jej macierzy i parametrów.
+"""
+from __future__ import annotations
+from collections import OrderedDict
+from typing import List, Tuple
+
+from .common_feasibility import route_feasible_ep_classified
+from .robust_cost import route_cost_contribution
+from .vrp_instance import VRPInstance
+
+__all__ = ["RouteCache"]
+
+
+class RouteCache:
+    __slots__ = ('inst', 'maxsize', 'data', 'hits', 'misses')
+
+    def __init__(self, inst: VRPInstance, maxsize: int = 100_000):
+        if maxsize < 1:
+            raise ValueError('maxsize musi być >= 1')
+        self.inst = inst
+        self.maxsize = maxsize
+        self.data: 'OrderedDict[tuple, list]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _entry(self, route: List[int]) -> list:
+        key = tuple(route)
+        data = self.data
+        entry = data.get(key)
+        if entry is None:
+            entry = data[key] = [None, None]
+            if len(data) > self.maxsize:
+                data.popitem(last=False)  # najdawniej używana trasa
+        else:
+            data.move_to_end(key)
+        return entry
+
+    def classify(self, route: List[int]) -> Tuple[bool, bool, bool, bool]:
+        entry = self._entry(route)
+        cls = entry[0]
+        if cls is None:
+            self.misses += 1
+            inst = self.inst
+            cls = entry[0] = route_feasible_ep_classified(
+                route, inst.time_E, inst.time_P, None, inst.day_horizon, inst.service_time,
+                window_arrays=inst.window_arrays)
+        else:
+            self.hits += 1
+        return cls
+
+    def contribution(self, route: List[int]) -> float:
+        entry = self._entry(route)
+        part = entry[1]
+        if part is None:
+            self.misses += 1
+            part = entry[1] = route_cost_contribution(route, self.inst)
+        else:
+            self.hits += 1
+        return part
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {'size': len(self.data), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / total if total else None}
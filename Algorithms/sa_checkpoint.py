@@ -0,0 +1,80 @@
+"""Checkpoint długich przebiegów SA – zwarty plik JSON zapisywany atomowo.
+
+Plik zawiera pełny `SAState` (trasy bieżące i najlepsze, T, epoka, liczniki, trace,
+stan generatora `random`) oraz parametry przebiegu i odcisk instancji
+(`VRPInstance.fingerprint()`). Wznowienie z innymi parametrami lub na innej instancji
+jest odrzucane; przy zgodnych – przebieg kończy się dokładnie tak, jak bez przerwy
+(stan generatora jest częścią checkpointu).
+Zapis: plik tymczasowy + `os.replace`, więc przerwanie w trakcie zapisu zostawia
+poprzedni, kompletny checkpoint.
+"""
+from __future__ import annotations
+import json
+import os
+from typing import Dict, Optional
+
+from .sa_vrp import SAState
+from .vrp_instance import VRPInstance
+
+__all__ = ["save_checkpoint", "load_checkpoint", "CHECKPOINT_VERSION"]
+
+CHECKPOINT_VERSION = 1
+
+
+def _rng_to_json(rng_state):
+    if rng_state is None:
+        return None
+    version, internal, gauss_next = rng_state
+    return [version, list(internal), gauss_next]
+
+
+def _rng_from_json(data):
+    if data is None:
+        return None
+    version, internal, gauss_next = data
+    return version, tuple(internal), gauss_next
+
+
+def save_checkpoint(path: str, state: SAState, inst: VRPInstance, params: Dict) -> None:
+    """Zapisz stan łańcucha `state` z parametrami przebiegu `params` (atomowo)."""
+    fields = state.__getstate__()
+    fields['rng_state'] = _rng_to_json(fields['rng_state'])
+    payload = {
+        'version': CHECKPOINT_VERSION,
+        'instance': inst.fingerprint(),
+        'params': params,
+        'state': fields,
+    }
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        # skalary NumPy (np.float64 w metrykach) zapisywane jako zwykłe liczby
+        json.dump(payload, f, default=lambda o: o.item())
+    os.replace(tmp, path)
+
+
+def load_checkpoint(path: str, inst: VRPInstance, params: Dict) -> Optional[SAState]:
+    """`SAState` z checkpointu lub None, gdy plik nie istnieje.
+
+    ValueError, gdy checkpoint pochodzi z innej wersji formatu, innej instancji
+    albo przebiegu o innych parametrach.
+    """
+    if not os.path.isfile(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        payload = json.load(f)
+    if payload.get('version') != CHECKPOINT_VERSION:
+        raise ValueError(f'Checkpoint {path}: nieobsługiwana wersja {payload.get("version")}')
+    if payload.get('instance') != inst.fingerprint():
+        raise ValueError(f'Checkpoint {path} dotyczy innej instancji (macierze / okna / parametry kosztu)')
+    saved = payload.get('params') or {}
+    diff = sorted(k for k in set(saved) | set(params) if saved.get(k) != params.get(k))
+    if diff:
+        raise ValueError(f'Checkpoint {path}: inne parametry przebiegu: {diff}')
+    fields = payload['state']
+    fields['rng_state'] = _rng_from_json(fields['rng_state'])
+    fields['trace'] = [tuple(row) for row in fields['trace']]
+    state = SAState.__new__(SAState)
+    state.__setstate__(fields)
+    return state
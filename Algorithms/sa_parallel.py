@@ -0,0 +1,196 @@
+"""Wielołańcuchowe SA (parallel tempering) w puli procesów.
+
+N łańcuchów `SAState` startuje z tych samych tras, każdy z własnym ziarnem
+(`SeedSequence.spawn`) i własną drabiną temperatur: łańcuch c ma T = t_max·ladder^c
+i kończy przy t_min·ladder^c, więc wszystkie wykonują tyle samo epok.
+Łańcuchy biegną segmentami po `exchange_every` epok w `ProcessPoolExecutor`
+(instancja trafia do workera raz – przez initializer), a między segmentami:
+ - 'pt'    – zamiana stanów sąsiednich łańcuchów z p = min(1, exp((1/T_i - 1/T_j)(E_i - E_j))),
+ - 'elite' – najgorszy bieżący łańcuch dostaje najlepsze dotąd rozwiązanie globalne,
+ - 'none'  – łańcuchy niezależne (multi-start).
+Wynik: globalnie najlepsze trasy + statystyki zgodne z `simulated_annealing`
+oraz lista statystyk per łańcuch (`stats['chains']`).
+"""
+from __future__ import annotations
+import math
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+from .route_cache import RouteCache
+from .sa_vrp import SAState, anneal_segment, compute_cost
+from .vrp_instance import VRPInstance, as_instance
+
+__all__ = ["parallel_tempering", "EXCHANGE_MODES"]
+
+EXCHANGE_MODES = ('pt', 'elite', 'none')
+
+_WORKER_INSTANCE: Optional[VRPInstance] = None
+_WORKER_CACHE: Optional[RouteCache] = None
+
+
+def _init_worker(inst: VRPInstance, route_cache_size: int = 0):
+    global _WORKER_INSTANCE, _WORKER_CACHE
+    _WORKER_INSTANCE = inst
+    # Cache zależy tylko od instancji – wspólny dla wszystkich łańcuchów obsługiwanych przez workera
+    _WORKER_CACHE = RouteCache(inst, route_cache_size) if route_cache_size > 0 else None
+
+
+def _run_segment(state: SAState, seg_kwargs: Dict) -> SAState:
+    return anneal_segment(state, _WORKER_INSTANCE, route_cache=_WORKER_CACHE, **seg_kwargs)
+
+
+def _exchange_pt(states: List[SAState], rng: random.Random) -> tuple:
+    """Próby zamiany stanów sąsiednich łańcuchów (parzyste/nieparzyste pary na przemian)."""
+    attempted = accepted = 0
+    start = rng.randrange(2)
+    for i in range(start, len(states) - 1, 2):
+        a, b = states[i], states[i + 1]
+        attempted += 1
+        x = (1.0 / a.T - 1.0 / b.T) * (a.current_cost - b.current_cost)
+        if x >= 0 or rng.random() < math.exp(x):
+            a.current, b.current = b.current, a.current
+            a.current_cost, b.current_cost = b.current_cost, a.current_cost
+            accepted += 1
+    return attempted, accepted
+
+
+def _exchange_elite(states: List[SAState]) -> tuple:
+    """Migracja elity: łańcuch z najgorszym bieżącym kosztem przejmuje globalne best."""
+    elite = min(states, key=lambda s: s.best_cost)
+    worst = max(states, key=lambda s: s.current_cost)
+    if worst is elite or worst.current_cost <= elite.best_cost:
+        return 1, 0
+    worst.current = [r[:] for r in elite.best]
+    worst.current_cost = elite.best_cost
+    return 1, 1
+
+
+def parallel_tempering(initial_routes: List[List[int]], matrices: Union[Dict[str, np.ndarray], VRPInstance],
+                       time_windows=None, chains: int = 4, workers: Optional[int] = None,
+                       exchange: str = 'pt', exchange_every: int = 5, ladder: float = 0.7,
+                       t_max: float = 1000.0, t_min: float = 1.0, alpha: float = 0.95,
+                       iters_per_T: int = 500, neighborhood: str = 'mixed', seed: Optional[int] = None,
+                       route_cache_size: int = 0, granular_k: int = 0, arc_filter: bool = False,
+                       **instance_params):
+    """Uruchom `chains` łańcuchów SA na `workers` procesach (None = min(chains, liczba CPU)).
+
+    Zwraca (best, best_cost, stats) jak `simulated_annealing`; liczniki w `stats` są sumą
+    po łańcuchach, `trace` to (epoka, T łańcucha 0, globalne best), a `stats['chains']`
+    i `stats['exchange']` opisują poszczególne łańcuchy i wymiany.
+    `route_cache_size > 0` – cache LRU tras (`RouteCache`) w każdym procesie.
+    """
+    if exchange not in EXCHANGE_MODES:
+        raise ValueError(f'Nieznany tryb wymiany: {exchange} (dozwolone: {EXCHANGE_MODES})')
+    if chains < 1:
+        raise ValueError('chains musi być >= 1')
+    if exchange_every < 1:
+        raise ValueError('exchange_every musi być >= 1')
+    inst = as_instance(matrices, time_windows, **instance_params)
+
+    seq = np.random.SeedSequence(seed)
+    children = seq.spawn(chains + 1)
+    chain_seeds = [int(c.generate_state(1)[0]) for c in children[:chains]]
+    rng = random.Random(int(children[-1].generate_state(1)[0]))
+
+    states: List[SAState] = []
+    t_mins: List[float] = []
+    for c, cs in enumerate(chain_seeds):
+        scale = ladder ** c
+        states.append(SAState(initial_routes, inst, t_max * scale, rng_state=random.Random(cs).getstate()))
+        t_mins.append(t_min * scale)
+    swaps_attempted = swaps_accepted = 0
+
+    def active(i: int) -> bool:
+        return states[i].T > t_mins[i]
+
+    def segment_kwargs(i: int) -> Dict:
+        return dict(t_min=t_mins[i], alpha=alpha, iters_per_T=iters_per_T,
+                    neighborhood=neighborhood, max_epochs=exchange_every, granular_k=granular_k,
+                    arc_filter=arc_filter)
+
+    if workers is None:
+        workers = min(chains, os.cpu_count() or 1)
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                               initargs=(inst, route_cache_size)) \
+        if workers > 1 and chains > 1 else None
+    route_cache = RouteCache(inst, route_cache_size) if pool is None and route_cache_size > 0 else None
+    try:
+        while any(active(i) for i in range(chains)):
+            running = [i for i in range(chains) if active(i)]
+            if pool is not None:
+                futures = {i: pool.submit(_run_segment, states[i], segment_kwargs(i)) for i in running}
+                for i, fut in futures.items():
+                    states[i] = fut.result()
+            else:
+                for i in running:
+                    anneal_segment(states[i], inst, route_cache=route_cache, **segment_kwargs(i))
+            if exchange == 'pt':
+                att, acc = _exchange_pt(states, rng)
+            elif exchange == 'elite':
+                att, acc = _exchange_elite(states)
+            else:
+                att, acc = 0, 0
+            swaps_attempted += att
+            swaps_accepted += acc
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    champion = min(states, key=lambda s: s.best_cost)
+    best_cost, best_metrics = compute_cost(champion.best, inst)
+
+    chain_stats = []
+    for c, st in enumerate(states):
+        chain_stats.append({
+            'chain': c,
+            'seed': chain_seeds[c],
+            't_start': t_max * ladder ** c,
+            't_final': st.T,
+            'epochs': st.epoch,
+            'best_cost': st.best_cost,
+            'accepted_moves': st.accepted_moves,
+            'improving_moves': st.improving_moves,
+            'total_attempts': st.total_attempts,
+            'rejected_window_E': st.rejected_window_E,
+            'rejected_window_P': st.rejected_window_P,
+            'rejected_window_both': st.rejected_window_both,
+            'route_cache_hits': st.route_cache_hits,
+            'route_cache_misses': st.route_cache_misses,
+        })
+
+    trace = []
+    for rows in zip(*(st.trace for st in states)):
+        trace.append((rows[0][0], rows[0][1], min(r[2] for r in rows)))
+
+    def total(key: str) -> int:
+        return sum(cs[key] for cs in chain_stats)
+
+    stats = {
+        'initial_cost': states[0].initial_cost,
+        'initial_metrics': states[0].initial_metrics,
+        'rejected_horizon': 0,
+        'accepted_moves': total('accepted_moves'),
+        'improving_moves': total('improving_moves'),
+        'total_attempts': total('total_attempts'),
+        'epochs': max(st.epoch for st in states),
+        'trace': trace,
+        'best_metrics': best_metrics,
+        'rejected_window_E': total('rejected_window_E'),
+        'rejected_window_P': total('rejected_window_P'),
+        'rejected_window_both': total('rejected_window_both'),
+        'route_cache_hits': total('route_cache_hits'),
+        'route_cache_misses': total('route_cache_misses'),
+        'chains': chain_stats,
+        'exchange': {
+            'mode': exchange,
+            'every_epochs': exchange_every,
+            'attempted': swaps_attempted,
+            'accepted': swaps_accepted,
+        },
+        'best_chain': states.index(champion),
+    }
+    return champion.best, best_cost, stats
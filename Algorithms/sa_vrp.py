@@ -6,14 +6,19 @@ Minimalna implementacja:
  - Sąsiedztwa: swap | relocate | two_opt | mixed.
 """
 from __future__ import annotations
-import random, math, copy, os, json
-from typing import List, Dict, Optional, Tuple
+import random, math, copy, os, json, time
+from abc import ABC, abstractmethod
+from typing import List, Dict, Optional, Tuple, Union
 
 import numpy as np
 
-from .robust_cost import calculate_vrp_cost_local_robust
+from .robust_cost import calculate_vrp_cost_local_robust, route_cost_contribution
+from .route_cache import RouteCache
 from .vrp_common_utilities import load_epo_times, get_epo_matrices, load_time_windows
-from .common_feasibility import route_feasible_ep_classified
+from .common_feasibility import (
+    ARC_VIO_E, ARC_VIO_P, route_feasible_ep_classified, route_schedule, insertion_feasible, removal_feasible,
+)
+from .vrp_instance import VRPInstance, as_instance
 
 # ---------------- Parsowanie tras (unifikacja JSON / summary) -----------------
 
@@ -64,18 +69,152 @@ def load_routes_generic(path: str) -> Tuple[List[List[int]], Optional[Dict]]:
 
 
 # ---------------- Operatory sąsiedztwa -----------------
+# Ruch opisuje sam siebie (typ, trasy, pozycje) i jest stosowany W MIEJSCU na liście tras;
+# `undo()` przywraca stan sprzed `apply()`. SA stosuje ruch, ocenia tylko trasy z
+# `touched()` i cofa go przy odrzuceniu – bez kopiowania całego rozwiązania.
 
-def neighborhood_swap(sol: List[List[int]]) -> Optional[List[List[int]]]:
+class Move(ABC):
+    __slots__ = ()
+    kind = ''
+
+    @abstractmethod
+    def touched(self, sol: List[List[int]]) -> Tuple[List[int], List[int], Optional[int]]:
+        """(zmienione trasy przed ruchem, zmienione trasy po ruchu, indeks usuniętej trasy lub None).
+        Wołane przed `apply`."""
+
+    @abstractmethod
+    def apply(self, sol: List[List[int]]) -> None:
+        """Zastosuj ruch w miejscu."""
+
+    @abstractmethod
+    def undo(self, sol: List[List[int]]) -> None:
+        """Cofnij `apply` (przywraca `sol` sprzed ruchu)."""
+
+    @abstractmethod
+    def arcs(self, sol: List[List[int]]) -> List[Tuple[int, int]]:
+        """Łuki utworzone przez ruch (wołane po `apply`) – do odrzucenia po macierzy zgodności."""
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{k}={getattr(self, k)}' for k in self.__slots__ if not k.startswith('_'))})"
+
+
+class SwapMove(Move):
+    __slots__ = ('r1', 'p1', 'r2', 'p2')
+    kind = 'swap'
+
+    def __init__(self, r1: int, p1: int, r2: int, p2: int):
+        self.r1 = r1; self.p1 = p1; self.r2 = r2; self.p2 = p2
+
+    def touched(self, sol):
+        idx = [self.r1] if self.r1 == self.r2 else [self.r1, self.r2]
+        return idx, idx, None
+
+    def apply(self, sol):
+        a = sol[self.r1]; b = sol[self.r2]
+        a[self.p1], b[self.p2] = b[self.p2], a[self.p1]
+
+    undo = apply  # zamiana jest swoją odwrotnością
+
+    def arcs(self, sol):
+        a = sol[self.r1]; b = sol[self.r2]
+        p1, p2 = self.p1, self.p2
+        return [(a[p1-1], a[p1]), (a[p1], a[p1+1]), (b[p2-1], b[p2]), (b[p2], b[p2+1])]
+
+
+class TwoOptMove(Move):
+    __slots__ = ('ri', 'i', 'j')
+    kind = 'two_opt'
+
+    def __init__(self, ri: int, i: int, j: int):
+        self.ri = ri; self.i = i; self.j = j
+
+    def touched(self, sol):
+        return [self.ri], [self.ri], None
+
+    def apply(self, sol):
+        r = sol[self.ri]
+        r[self.i:self.j] = r[self.i:self.j][::-1]
+
+    undo = apply  # odwrócenie odcinka jest swoją odwrotnością
+
+    def arcs(self, sol):
+        r = sol[self.ri]
+        return [(r[k], r[k+1]) for k in range(self.i - 1, self.j)]
+
+
+class RelocateMove(Move):
+    """Przeniesienie klienta z `sol[src][pos]` do trasy `dest` na pozycję `insert_pos`.
+
+    `dest` to indeks w `sol` przed ruchem, `insert_pos` – pozycja w trasie docelowej już po
+    wyjęciu klienta. Trasa źródłowa, która staje się pusta, jest usuwana z listy.
+    """
+    __slots__ = ('src', 'pos', 'dest', 'insert_pos', '_client', '_removed')
+    kind = 'relocate'
+
+    def __init__(self, src: int, pos: int, dest: int, insert_pos: int):
+        self.src = src; self.pos = pos; self.dest = dest; self.insert_pos = insert_pos
+        self._client = None; self._removed = None
+
+    def _is_noop(self, sol) -> bool:
+        # jedyna trasa z jednym klientem – wynik identyczny jak stan wyjściowy
+        return len(sol) == 1 and len(sol[self.src]) == 3
+
+    def touched(self, sol):
+        src, dest = self.src, self.dest
+        if len(sol[src]) == 3 and len(sol) > 1:
+            # trasa źródłowa znika, indeks celu przesuwa się o jeden w lewo
+            return [src, dest], [dest - 1 if dest > src else dest], src
+        if dest == src:
+            return [src], [src], None
+        return [src, dest], [src, dest], None
+
+    def apply(self, sol):
+        if self._is_noop(sol):
+            self._removed = None
+            return
+        target = sol[self.dest]
+        self._client = sol[self.src].pop(self.pos)
+        if len(sol[self.src]) == 2:  # stała się pusta
+            self._removed = sol.pop(self.src)
+        else:
+            self._removed = None
+        target.insert(self.insert_pos, self._client)
+
+    def undo(self, sol):
+        if self._client is None:
+            return
+        dest = self.dest - 1 if (self._removed is not None and self.dest > self.src) else self.dest
+        sol[dest].pop(self.insert_pos)
+        if self._removed is not None:
+            sol.insert(self.src, self._removed)
+        sol[self.src].insert(self.pos, self._client)
+        self._client = None
+
+    def arcs(self, sol):
+        client = self._client
+        if client is None:
+            return []
+        if self.dest == self.src:
+            r = sol[self.src]
+            return [(r[k], r[k+1]) for k in range(len(r) - 1)]
+        dest = self.dest - 1 if (self._removed is not None and self.dest > self.src) else self.dest
+        r = sol[dest]; p = self.insert_pos
+        out = [(r[p-1], client), (client, r[p+1])]
+        if self._removed is None:
+            s = sol[self.src]
+            out.append((s[self.pos-1], s[self.pos]))
+        return out
+
+
+def propose_swap(sol: List[List[int]]) -> Optional[SwapMove]:
     # Zbierz wszystkie (route_index, pos) dla klientów (bez depotów)
     positions = [(ri, pi) for ri, r in enumerate(sol) for pi in range(1, len(r)-1)]
     if len(positions) < 2:
         return None
     (r1, p1), (r2, p2) = random.sample(positions, 2)
-    new_sol = copy.deepcopy(sol)
-    new_sol[r1][p1], new_sol[r2][p2] = new_sol[r2][p2], new_sol[r1][p1]
-    return new_sol
+    return SwapMove(r1, p1, r2, p2)
 
-def neighborhood_relocate(sol: List[List[int]]) -> Optional[List[List[int]]]:
+def propose_relocate(sol: List[List[int]]) -> Optional[RelocateMove]:
     routes_non_empty = [ri for ri, r in enumerate(sol) if len(r) > 2]
     if not routes_non_empty:
         return None
@@ -85,30 +224,18 @@ def neighborhood_relocate(sol: List[List[int]]) -> Optional[List[List[int]]]:
         pos_client = 1
     else:
         pos_client = random.randint(1, len(r_src)-2)
-    client = r_src[pos_client]
     dest = random.randrange(len(sol))
     if dest == src and len(r_src) <= 3:
         # nic sensownego – spróbuj innej trasy docelowej jeśli istnieje
         if len(sol) > 1:
             dest = (dest + 1) % len(sol)
-    new_sol = copy.deepcopy(sol)
-    new_sol[src].pop(pos_client)
-    if len(new_sol[src]) == 2:  # stała się pusta
-        del new_sol[src]
-        if dest > src:
-            dest -= 1
-    # jeśli po usunięciu nie ma tras, dodaj nową
-    if not new_sol:
-        new_sol.append([0, client, 0])
-        return new_sol
-    if dest >= len(new_sol):
-        dest = len(new_sol)-1
-    insert_route = new_sol[dest]
-    insert_pos = random.randint(1, len(insert_route)-1)
-    insert_route.insert(insert_pos, client)
-    return new_sol
+    if len(r_src) == 3 and len(sol) == 1:
+        return RelocateMove(src, pos_client, dest, 1)
+    dest_len = len(sol[dest]) - (1 if dest == src else 0)
+    insert_pos = random.randint(1, dest_len-1)
+    return RelocateMove(src, pos_client, dest, insert_pos)
 
-def neighborhood_two_opt(sol: List[List[int]]) -> Optional[List[List[int]]]:
+def propose_two_opt(sol: List[List[int]]) -> Optional[TwoOptMove]:
     candidate_routes = [ri for ri, r in enumerate(sol) if len(r) > 4]
     if not candidate_routes:
         return None
@@ -116,11 +243,104 @@ def neighborhood_two_opt(sol: List[List[int]]) -> Optional[List[List[int]]]:
     r = sol[ri]
     i = random.randint(1, len(r)-3)
     j = random.randint(i+1, len(r)-2)
-    new_r = r[:i] + list(reversed(r[i:j])) + r[j:]
-    new_sol = copy.deepcopy(sol)
-    new_sol[ri] = new_r
+    return TwoOptMove(ri, i, j)
+
+MOVE_PROPOSERS = {
+    'swap': propose_swap,
+    'relocate': propose_relocate,
+    'two_opt': propose_two_opt,
+}
+
+# ---------------- Operatory granularne -----------------
+# Zamiast losować parę pozycji z całego rozwiązania, klient `c` trafia obok jednego
+# z k najbliższych sąsiadów `v` (listy liczone raz na segment). Odrzucane są
+# w ten sposób z góry ruchy łączące odległych klientów, które prawie zawsze pogarszają koszt.
+
+def neighbor_lists(time_E: np.ndarray, k: int) -> List[List[int]]:
+    """Dla każdego klienta k najbliższych klientów wg czasu expected (t_ij + t_ji), rosnąco;
+    depot (0) ma pustą listę."""
+    n = time_E.shape[0]
+    k = min(int(k), n - 2)
+    if k < 1:
+        return [[] for _ in range(n)]
+    d = time_E + time_E.T
+    d[0, :] = np.inf
+    d[:, 0] = np.inf
+    np.fill_diagonal(d, np.inf)
+    near = np.argpartition(d, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(d, near, axis=1).argsort(axis=1, kind='stable')
+    out = np.take_along_axis(near, order, axis=1).tolist()
+    out[0] = []
+    return out
+
+def _locate(sol: List[List[int]], client: int) -> Tuple[int, int]:
+    for ri, r in enumerate(sol):
+        if client in r:
+            return ri, r.index(client)
+    raise ValueError(f'Klient {client} nie występuje w rozwiązaniu')
+
+def _pick_client(sol: List[List[int]]) -> Optional[Tuple[int, int]]:
+    routes_non_empty = [ri for ri, r in enumerate(sol) if len(r) > 2]
+    if not routes_non_empty:
+        return None
+    src = random.choice(routes_non_empty)
+    return src, random.randint(1, len(sol[src]) - 2)
+
+def propose_relocate_granular(sol: List[List[int]], neighbors: List[List[int]]) -> Optional[RelocateMove]:
+    """Relocate klienta tuż przed lub tuż za losowego sąsiada z listy granularnej."""
+    picked = _pick_client(sol)
+    if picked is None:
+        return None
+    src, pos = picked
+    near = neighbors[sol[src][pos]]
+    if not near:
+        return None
+    dest, pos_v = _locate(sol, random.choice(near))
+    if dest == src and pos_v > pos:
+        pos_v -= 1  # pozycja sąsiada po wyjęciu klienta
+    insert_pos = pos_v + random.randint(0, 1)
+    if dest == src and insert_pos == pos:
+        return None  # klient już stoi w tym miejscu
+    return RelocateMove(src, pos, dest, insert_pos)
+
+def propose_swap_granular(sol: List[List[int]], neighbors: List[List[int]]) -> Optional[SwapMove]:
+    """Swap klienta z poprzednikiem lub następnikiem losowego sąsiada – klient staje obok sąsiada."""
+    picked = _pick_client(sol)
+    if picked is None:
+        return None
+    src, pos = picked
+    near = neighbors[sol[src][pos]]
+    if not near:
+        return None
+    rv, pv = _locate(sol, random.choice(near))
+    slots = [p for p in (pv - 1, pv + 1) if 1 <= p <= len(sol[rv]) - 2 and (rv, p) != (src, pos)]
+    if not slots:
+        return None
+    return SwapMove(src, pos, rv, random.choice(slots))
+
+def granular_proposers(time_E: np.ndarray, k: int) -> Dict:
+    """`MOVE_PROPOSERS` z granularnymi wariantami swap/relocate (k najbliższych sąsiadów)."""
+    neighbors = neighbor_lists(time_E, k)
+    return dict(MOVE_PROPOSERS,
+                swap=lambda sol: propose_swap_granular(sol, neighbors),
+                relocate=lambda sol: propose_relocate_granular(sol, neighbors))
+
+def _applied_copy(sol: List[List[int]], move: Optional[Move]) -> Optional[List[List[int]]]:
+    if move is None:
+        return None
+    new_sol = [r[:] for r in sol]
+    move.apply(new_sol)
     return new_sol
 
+def neighborhood_swap(sol: List[List[int]]) -> Optional[List[List[int]]]:
+    return _applied_copy(sol, propose_swap(sol))
+
+def neighborhood_relocate(sol: List[List[int]]) -> Optional[List[List[int]]]:
+    return _applied_copy(sol, propose_relocate(sol))
+
+def neighborhood_two_opt(sol: List[List[int]]) -> Optional[List[List[int]]]:
+    return _applied_copy(sol, propose_two_opt(sol))
+
 NEIGH_FUN = {
     'swap': neighborhood_swap,
     'relocate': neighborhood_relocate,
@@ -130,15 +350,17 @@ NEIGH_FUN = {
 
 # ---------------- SA core -----------------
 
-def compute_cost(routes: List[List[int]], matrices, time_windows, day_horizon, service_time,
-                 cost_per_km, vehicle_fixed_cost, penalty_horizon_per_min,
-                 time_weight: float = 1.0) -> Tuple[float, Dict]:
+def compute_cost(routes: List[List[int]], matrices, time_windows=None, day_horizon=600, service_time=0.0,
+                 cost_per_km=1.0, vehicle_fixed_cost=900.0, penalty_horizon_per_min=120.0,
+                 time_weight: float = 1.0, window_arrays=None, with_metrics: bool = True):
     """Wrapper dla `calculate_vrp_cost_local_robust`.
     
     `penalty_late_per_min` jest celowo pominięty i zerowany w SA, ponieważ
     filtr E/P (twarde okna) eliminuje spóźnienia.
+    Dla `VRPInstance` wystarczy `compute_cost(routes, instance)`.
+    `with_metrics=False` – zwraca sam koszt (float), bez budowania słownika metryk.
     """
-    cost, metrics = calculate_vrp_cost_local_robust(
+    return calculate_vrp_cost_local_robust(
         routes, matrices, time_windows,
         day_horizon=day_horizon,
         service_time=service_time,
@@ -146,76 +368,208 @@ def compute_cost(routes: List[List[int]], matrices, time_windows, day_horizon, s
         vehicle_fixed_cost=vehicle_fixed_cost,
         penalty_horizon_per_min=penalty_horizon_per_min,
         time_weight=time_weight,
+        window_arrays=window_arrays,
+        with_metrics=with_metrics,
     )
-    return cost, metrics
 
 
-def simulated_annealing(initial_routes: List[List[int]], matrices: Dict[str, np.ndarray],
-                        time_windows: Optional[Dict[int, tuple]] = None,
-                        day_horizon: int = 600, service_time: float = 0.0,
-                        cost_per_km: float = 1.0, vehicle_fixed_cost: float = 900.0,
-                        penalty_horizon_per_min: float = 120.0,
-                        time_weight: float = 1.0,
-                        t_max: float = 1000.0, t_min: float = 1.0, alpha: float = 0.95,
-                        iters_per_T: int = 500, neighborhood: str = 'mixed', seed: Optional[int] = None):
-    if seed is not None:
-        random.seed(seed)
-        np.random.seed(seed)
+class SAState:
+    """Stan jednego łańcucha SA po dowolnej epoce.
+
+    Pozwala przerwać wyżarzanie i kontynuować je później (także w innym procesie):
+    trasy bieżące i najlepsze, temperatura, liczniki, trace oraz stan generatora
+    `random` (`rng_state=None` – używaj bieżącego stanu globalnego generatora).
+    """
+    __slots__ = (
+        'current', 'current_cost', 'best', 'best_cost', 'T', 'epoch',
+        'accepted_moves', 'improving_moves', 'total_attempts',
+        'rejected_window_E', 'rejected_window_P', 'rejected_window_both',
+        'trace', 'initial_cost', 'initial_metrics', 'rng_state',
+        'route_cache_hits', 'route_cache_misses', 'reheats',
+    )
+
+    def __init__(self, initial_routes: List[List[int]], inst: VRPInstance, t_max: float,
+                 rng_state: Optional[tuple] = None):
+        self.current = copy.deepcopy(initial_routes)
+        self.best = copy.deepcopy(initial_routes)
+        # Kara za spóźnienia (lateness) jest zerowana, ponieważ filtr E/P i twarde okna
+        # uniemożliwiają generowanie niedopuszczalnych (spóźnionych) rozwiązań.
+        self.initial_cost, self.initial_metrics = compute_cost(self.current, inst)
+        self.current_cost = sum(route_cost_contribution(r, inst) for r in self.current)
+        self.best_cost = self.current_cost
+        self.T = t_max
+        self.epoch = 0
+        self.accepted_moves = 0
+        self.improving_moves = 0
+        self.total_attempts = 0
+        self.rejected_window_E = 0
+        self.rejected_window_P = 0
+        self.rejected_window_both = 0
+        self.trace: List[Tuple[int, float, float]] = []
+        self.rng_state = rng_state
+        self.route_cache_hits = 0
+        self.route_cache_misses = 0
+        self.reheats = 0
+
+    def __getstate__(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    def __setstate__(self, state):
+        for k, v in state.items():
+            setattr(self, k, v)
+
+
+def anneal_segment(state: SAState, inst: VRPInstance, t_min: float = 1.0, alpha: float = 0.95,
+                   iters_per_T: int = 500, neighborhood: str = 'mixed',
+                   max_epochs: Optional[int] = None, route_cache: Optional[RouteCache] = None,
+                   granular_k: int = 0, arc_filter: bool = False, deadline: Optional[float] = None) -> SAState:
+    """Kontynuuj wyżarzanie ze stanu `state` aż do `t_min` lub przez `max_epochs` epok.
 
-    current = copy.deepcopy(initial_routes)
-    best = copy.deepcopy(initial_routes)
-    # Kara za spóźnienia (lateness) jest zerowana, ponieważ filtr E/P i twarde okna
-    # uniemożliwiają generowanie niedopuszczalnych (spóźnionych) rozwiązań.
-    current_cost, current_metrics = compute_cost(current, matrices, time_windows, day_horizon, service_time,
-                                                 cost_per_km, vehicle_fixed_cost, penalty_horizon_per_min,
-                                                 time_weight=time_weight)
-    # Zachowaj koszt startowy przed jakąkolwiek poprawą – potrzebny do poprawnego wyliczenia improvement_pct
-    initial_cost = current_cost
-    best_cost = current_cost
-    best_metrics = current_metrics
-
-    T = t_max
+    Modyfikuje i zwraca `state`. Pamięci podręczne (wkłady tras, klasyfikacja,
+    harmonogramy) odtwarzane są na początku segmentu z `state.current`.
+    `route_cache` (`RouteCache` tej samej instancji) – klasyfikacja i wkład w koszt
+    tras brane z cache LRU; trafienia/chybienia segmentu dopisywane są do `state`.
+    `granular_k > 0` – swap/relocate tylko obok k najbliższych sąsiadów (`granular_proposers`).
+    `arc_filter` (domyślnie wyłączony) – kandydat z łukiem niezgodnym z oknami
+    (`VRPInstance.arc_codes`) odrzucany jest bez klasyfikacji tras; decyzje (a więc trajektoria)
+    bez zmian, ale flagi naruszeń takiego kandydata pochodzą z kodów łuków, więc liczniki
+    rejected_window_* przestają mieć znaczenie z klasyfikacji tras (mogą pominąć naruszenia).
+    `deadline` (`time.monotonic()`) – sprawdzany w każdej iteracji; po jego upływie bieżąca
+    epoka jest przerywana i segment kończy się.
+    """
+    if state.rng_state is not None:
+        random.setstate(state.rng_state)
+
+    day_horizon = inst.day_horizon
+    service_time = inst.service_time
+    window_arrays = inst.window_arrays
+    time_E = inst.time_E
+    time_P = inst.time_P
+
+    if route_cache is not None:
+        contribution = route_cache.contribution
+        cache_hits0, cache_misses0 = route_cache.hits, route_cache.misses
+    else:
+        def contribution(route: List[int]) -> float:
+            return route_cost_contribution(route, inst)
+
+    current = state.current
+    best = state.best
+    # Koszt w pętli liczony przyrostowo: wkład każdej trasy trzymamy w `cur_parts`,
+    # a ruch przelicza tylko trasy, które zmienia (swap/relocate: max 2, two_opt: 1).
+    cur_parts = [contribution(r) for r in current]
+    current_cost = state.current_cost
+    best_cost = state.best_cost
+
+    T = state.T
     neigh_keys = list(NEIGH_FUN.keys()) if neighborhood == 'mixed' else [neighborhood]
-    
+    proposers = granular_proposers(time_E, granular_k) if granular_k > 0 else MOVE_PROPOSERS
+    arc_codes = inst.arc_codes() if arc_filter else None
+
     # Statystyki odrzuceń
-    rejected_horizon = 0
-    rejected_window_E = 0
-    rejected_window_P = 0
-    rejected_window_both = 0
-    
-    time_E = matrices['expected']
-    time_P = matrices['pessimistic']
+    rejected_window_E = state.rejected_window_E
+    rejected_window_P = state.rejected_window_P
+    rejected_window_both = state.rejected_window_both
+
+    if route_cache is not None:
+        classify = route_cache.classify
+    else:
+        def classify(route: List[int]) -> Tuple[bool, bool, bool, bool]:
+            return route_feasible_ep_classified(route, time_E, time_P, None, day_horizon, service_time,
+                                                window_arrays=window_arrays)
+
+    # Klasyfikacja dopuszczalności każdej trasy bieżącego rozwiązania (ok, vio_E, vio_P, vio_both).
+    # Kandydat różni się od `current` tylko trasami zwróconymi przez `_move_touched`, więc
+    # sprawdzamy wyłącznie je; flagi pozostałych tras bierzemy z `cur_class`.
+    cur_class = [classify(r) for r in current]
+    cur_bad = {ri for ri, c in enumerate(cur_class) if not c[0]}
+    # Harmonogramy (RouteSchedule) tras bieżącego rozwiązania – liczone leniwie,
+    # unieważniane tylko dla tras zmienionych przez zaakceptowany ruch.
+    # Pozwalają potwierdzić relocate między trasami w O(1).
+    cur_sched: List[Optional[object]] = [None] * len(current)
 
-    epoch = 0
-    accepted_moves = 0
-    improving_moves = 0
-    trace: List[Tuple[int, float, float]] = []
-    total_attempts = 0
+    def sched_of(ri: int):
+        sc = cur_sched[ri]
+        if sc is None:
+            sc = cur_sched[ri] = route_schedule(current[ri], time_E, time_P, window_arrays, day_horizon, service_time)
+        return sc
 
-    while T > t_min:
+    def relocate_fast_ok(move: RelocateMove) -> bool:
+        src, pos_client, dest, insert_pos = move.src, move.pos, move.dest, move.insert_pos
+        if dest == src or len(current) == 1:
+            return False  # relocate w obrębie trasy – zwykła kontrola zmienionej trasy
+        if len(current[src]) > 3 and not removal_feasible(
+                sched_of(src), pos_client, time_E, time_P, window_arrays, day_horizon, service_time):
+            return False
+        return insertion_feasible(sched_of(dest), insert_pos, current[src][pos_client],
+                                  time_E, time_P, window_arrays, day_horizon, service_time)
+
+    epoch = state.epoch
+    accepted_moves = state.accepted_moves
+    improving_moves = state.improving_moves
+    trace = state.trace
+    total_attempts = state.total_attempts
+    epochs_left = max_epochs if max_epochs is not None else -1
+    timed_out = False
+    now = time.monotonic
+
+    while T > t_min and epochs_left != 0:
         for _ in range(iters_per_T):
+            if deadline is not None and now() >= deadline:
+                timed_out = True
+                break
             total_attempts += 1
             neigh_key = random.choice(neigh_keys)
-            candidate = NEIGH_FUN[neigh_key](current)
-            if candidate is None:
+            move = proposers[neigh_key](current)
+            if move is None:
                 continue
+            old_idx, new_idx, removed_idx = move.touched(current)
 
-            # Weryfikacja dopuszczalności – wszystkie trasy muszą być OK
+            # Weryfikacja dopuszczalności – wszystkie trasy muszą być OK.
+            # Niezmienione trasy: flagi z `cur_class`; zmienione: ponowna klasyfikacja po
+            # zastosowaniu ruchu w miejscu (relocate potwierdzony w O(1) jej nie potrzebuje).
             is_feasible = True
             cand_vio_E, cand_vio_P, cand_vio_both = False, False, False
-            
-            for r in candidate:
-                ok, vio_E, vio_P, vio_both = route_feasible_ep_classified(
-                    r, time_E, time_P, time_windows, day_horizon, service_time
-                )
-                if not ok:
+            for ri in cur_bad:
+                if ri not in old_idx:
+                    _, vio_E, vio_P, vio_both = cur_class[ri]
                     is_feasible = False
-                    # Agreguj flagi naruszeń z poszczególnych tras
                     if vio_E: cand_vio_E = True
                     if vio_P: cand_vio_P = True
                     if vio_both: cand_vio_both = True
+
+            fast_ok = is_feasible and neigh_key == 'relocate' and relocate_fast_ok(move)
+            move.apply(current)
+            if not fast_ok and arc_codes is not None:
+                # Łuki utworzone przez ruch: kod != 0 wyklucza kandydata bez skanu tras
+                arc_bad = False
+                for a, b in move.arcs(current):
+                    code = arc_codes[a, b]
+                    if code:
+                        arc_bad = True
+                        if code & ARC_VIO_E: cand_vio_E = True
+                        if code & ARC_VIO_P: cand_vio_P = True
+                        if code == ARC_VIO_E | ARC_VIO_P: cand_vio_both = True
+                if arc_bad:
+                    move.undo(current)
+                    if cand_vio_E: rejected_window_E += 1
+                    if cand_vio_P: rejected_window_P += 1
+                    if cand_vio_both: rejected_window_both += 1
+                    continue
+            if fast_ok:
+                new_class = [(True, False, False, False)] * len(new_idx)
+            else:
+                new_class = [classify(current[i]) for i in new_idx]
+                for ok, vio_E, vio_P, vio_both in new_class:
+                    if not ok:
+                        is_feasible = False
+                        # Agreguj flagi naruszeń z poszczególnych tras
+                        if vio_E: cand_vio_E = True
+                        if vio_P: cand_vio_P = True
+                        if vio_both: cand_vio_both = True
             
             if not is_feasible:
+                move.undo(current)
                 # Zliczanie typów naruszeń dla celów analitycznych
                 if cand_vio_E: rejected_window_E += 1
                 if cand_vio_P: rejected_window_P += 1
@@ -225,55 +579,218 @@ def simulated_annealing(initial_routes: List[List[int]], matrices: Dict[str, np.
                 # Dla uproszczenia nie tworzymy osobnego licznika, gdyż jest to podkategoria `vio_E`.
                 continue
 
-            cand_cost, _ = compute_cost(candidate, matrices, time_windows, day_horizon, service_time,
-                                        cost_per_km, vehicle_fixed_cost, penalty_horizon_per_min,
-                                        time_weight=time_weight)
-            
-            delta = cand_cost - current_cost
+            # Delta kosztu tylko ze zmienionych tras
+            new_parts = [contribution(current[i]) for i in new_idx]
+            delta = sum(new_parts) - sum(cur_parts[i] for i in old_idx)
+            cand_cost = current_cost + delta
+
             if delta < 0:
-                current = candidate
-                current_cost = cand_cost
                 improving_moves += 1
+                accepted = True
+            else:
+                accepted = math.exp(-delta / T) > random.random()
+            if not accepted:
+                move.undo(current)
+            else:
+                current_cost = cand_cost
+                if removed_idx is not None:
+                    del cur_parts[removed_idx]
+                    del cur_class[removed_idx]
+                    del cur_sched[removed_idx]
+                for i, part, cls in zip(new_idx, new_parts, new_class):
+                    cur_parts[i] = part
+                    cur_class[i] = cls
+                    cur_sched[i] = None
+                if cur_bad or removed_idx is not None or not all(c[0] for c in new_class):
+                    cur_bad = {ri for ri, c in enumerate(cur_class) if not c[0]}
                 accepted_moves += 1
                 if cand_cost < best_cost:
-                    best = candidate
+                    best = [r[:] for r in current]
                     best_cost = cand_cost
-                    # Metryki liczymy tylko dla najlepszego rozwiązania, aby oszczędzić czas
-                    _, best_metrics = compute_cost(best, matrices, time_windows, day_horizon, service_time,
-                                                   cost_per_km, vehicle_fixed_cost, penalty_horizon_per_min,
-                                                   time_weight=time_weight)
-            elif math.exp(-delta / T) > random.random():
-                current = candidate
-                current_cost = cand_cost
-                accepted_moves += 1
         
         trace.append((epoch, T, best_cost))
         T *= alpha
         epoch += 1
+        epochs_left -= 1
+        if timed_out:
+            break
+
+    state.current_cost = current_cost
+    state.best = best
+    state.best_cost = best_cost
+    state.T = T
+    state.epoch = epoch
+    state.accepted_moves = accepted_moves
+    state.improving_moves = improving_moves
+    state.total_attempts = total_attempts
+    state.rejected_window_E = rejected_window_E
+    state.rejected_window_P = rejected_window_P
+    state.rejected_window_both = rejected_window_both
+    if state.rng_state is not None:
+        state.rng_state = random.getstate()
+    if route_cache is not None:
+        state.route_cache_hits += route_cache.hits - cache_hits0
+        state.route_cache_misses += route_cache.misses - cache_misses0
+    return state
+
+
+def anneal_timed(state: SAState, inst: VRPInstance, deadline: float, t_min: float = 1.0, alpha: float = 0.95,
+                 iters_per_T: int = 500, neighborhood: str = 'mixed', reheat: float = 0.0,
+                 stagnation_epochs: int = 20, **segment_kwargs) -> SAState:
+    """Wyżarzanie ze stanu `state` do chwili `deadline` (`time.monotonic()`).
+
+    Pierwsza epoka (z `alpha`) mierzy czas epoki; potem alpha jest przeliczana tak, by T spadła
+    z bieżącej wartości do `t_min` dokładnie w pozostałym czasie: alpha = (t_min / T)^(1 / epoki),
+    a pomiar tempa odświeżany jest ok. 10 razy w trakcie. `reheat > 0` – po `stagnation_epochs`
+    epokach bez poprawy best (lub po zejściu do t_min przed czasem) T wraca do reheat·T_start
+    i harmonogram jest przeliczany na nowo. Deadline sprawdzany jest w każdej iteracji SA.
+    """
+    t_reheat = reheat * state.T
+    busy = 0.0
+    epochs_done = 0
+    seg_epochs = 1
+    last_best = state.best_cost
+    last_improvement = state.epoch
+    while time.monotonic() < deadline and state.T > t_min:
+        start = time.monotonic()
+        epoch0 = state.epoch
+        anneal_segment(state, inst, t_min=t_min, alpha=alpha, iters_per_T=iters_per_T,
+                       neighborhood=neighborhood, max_epochs=seg_epochs, deadline=deadline, **segment_kwargs)
+        busy += time.monotonic() - start
+        epochs_done += state.epoch - epoch0
+        if state.best_cost < last_best:
+            last_best = state.best_cost
+            last_improvement = state.epoch
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not epochs_done:
+            break
+        epochs_left = max(1, int(remaining / (busy / epochs_done)))
+        # Ponowne grzanie tylko gdy zostało dość czasu, by znów schłodzić (>= stagnation_epochs epok)
+        if (t_reheat > max(state.T, t_min) and epochs_left >= stagnation_epochs
+                and (state.T <= t_min or state.epoch - last_improvement >= stagnation_epochs)):
+            state.T = t_reheat
+            state.reheats += 1
+            last_improvement = state.epoch
+        if state.T > t_min:
+            alpha = (t_min / state.T) ** (1.0 / epochs_left)
+        seg_epochs = max(1, epochs_left // 10)
+        if reheat > 0:
+            seg_epochs = min(seg_epochs, stagnation_epochs)
+    return state
+
+
+def sa_result(state: SAState, inst: VRPInstance):
+    """(best, best_cost, stats) ze stanu łańcucha – format wyniku `simulated_annealing`."""
+    # Koszt i metryki najlepszego rozwiązania liczone raz, pełną funkcją kosztu
+    best_cost, best_metrics = compute_cost(state.best, inst)
 
     stats = {
-        'initial_cost': initial_cost,
-        'initial_metrics': current_metrics,  # Metryki startowe
-        'rejected_horizon': rejected_horizon, # Ten licznik jest już nieużywany, ale zostaje dla API
-        'accepted_moves': accepted_moves,
-        'improving_moves': improving_moves,
-        'total_attempts': total_attempts,
-        'epochs': epoch,
-        'trace': trace,
+        'initial_cost': state.initial_cost,
+        'initial_metrics': state.initial_metrics,  # Metryki startowe
+        'rejected_horizon': 0, # Ten licznik jest już nieużywany, ale zostaje dla API
+        'accepted_moves': state.accepted_moves,
+        'improving_moves': state.improving_moves,
+        'total_attempts': state.total_attempts,
+        'epochs': state.epoch,
+        'trace': state.trace,
         'best_metrics': best_metrics,
-        'rejected_window_E': rejected_window_E,
-        'rejected_window_P': rejected_window_P,
-        'rejected_window_both': rejected_window_both,
+        'rejected_window_E': state.rejected_window_E,
+        'rejected_window_P': state.rejected_window_P,
+        'rejected_window_both': state.rejected_window_both,
+        'route_cache_hits': state.route_cache_hits,
+        'route_cache_misses': state.route_cache_misses,
+        'reheats': state.reheats,
     }
-    return best, best_cost, stats
+    return state.best, best_cost, stats
+
+
+def simulated_annealing(initial_routes: List[List[int]], matrices: Union[Dict[str, np.ndarray], VRPInstance],
+                        time_windows: Optional[Dict[int, tuple]] = None,
+                        day_horizon: Optional[int] = None, service_time: Optional[float] = None,
+                        cost_per_km: Optional[float] = None, vehicle_fixed_cost: Optional[float] = None,
+                        penalty_horizon_per_min: Optional[float] = None,
+                        time_weight: Optional[float] = None,
+                        t_max: float = 1000.0, t_min: float = 1.0, alpha: float = 0.95,
+                        iters_per_T: int = 500, neighborhood: str = 'mixed', seed: Optional[int] = None,
+                        route_cache_size: int = 0, granular_k: int = 0, arc_filter: bool = False,
+                        time_limit: Optional[float] = None, reheat: float = 0.0, stagnation_epochs: int = 20,
+                        checkpoint: Optional[str] = None, checkpoint_every: int = 10, resume: bool = False):
+    """`matrices` może być `VRPInstance` – wtedy okna pochodzą z instancji, a horyzont,
+    service_time i stałe kosztowe podane jawnie (nie None) nadpisują jej parametry.
+    `route_cache_size > 0` – cache LRU klasyfikacji i kosztu tras (`RouteCache`) na tyle tras;
+    liczniki trafień w `stats['route_cache_hits']` / `stats['route_cache_misses']`.
+    `granular_k > 0` – granularne swap/relocate (k najbliższych sąsiadów wg czasu E).
+    `arc_filter` – wstępne odrzucanie ruchów po macierzy zgodności łuków (opt-in, `anneal_segment`).
+    `time_limit` (sekundy) – tryb budżetu czasu (`anneal_timed`): harmonogram od t_max do t_min
+    dopasowany do zmierzonego tempa, `alpha` to tylko wartość startowa; `reheat` /
+    `stagnation_epochs` – ponowne grzanie przy stagnacji. Liczone od wejścia do funkcji.
+    `checkpoint` – ścieżka pliku stanu (`sa_checkpoint`) zapisywanego co `checkpoint_every` epok;
+    `resume=True` – kontynuuj z istniejącego checkpointu (`initial_routes` są wtedy pomijane,
+    wynik identyczny jak bez przerwy). Checkpointy nie łączą się z `time_limit`."""
+    if checkpoint is not None and time_limit is not None:
+        raise ValueError('checkpoint nie jest obsługiwany w trybie time_limit')
+    started = time.monotonic()
+    if seed is not None:
+        random.seed(seed)
+        np.random.seed(seed)
+
+    inst = as_instance(
+        matrices, time_windows,
+        day_horizon=day_horizon, service_time=service_time,
+        cost_per_km=cost_per_km, vehicle_fixed_cost=vehicle_fixed_cost,
+        penalty_horizon_per_min=penalty_horizon_per_min, time_weight=time_weight,
+    )
+    route_cache = RouteCache(inst, route_cache_size) if route_cache_size > 0 else None
+    if checkpoint is not None:
+        from .sa_checkpoint import load_checkpoint, save_checkpoint
+        # Parametry wpływające na trajektorię – wznowienie wymaga identycznych
+        run_params = {'t_max': t_max, 't_min': t_min, 'alpha': alpha, 'iters_per_T': iters_per_T,
+                      'neighborhood': neighborhood, 'seed': seed, 'granular_k': granular_k}
+        state = load_checkpoint(checkpoint, inst, run_params) if resume else None
+        resumed_epoch = state.epoch if state is not None else None
+        if state is None:
+            state = SAState(initial_routes, inst, t_max)
+            # Stan generatora w `state` – segmenty zapisują go, więc wznowienie kontynuuje ten sam strumień
+            state.rng_state = random.getstate()
+        while state.T > t_min:
+            anneal_segment(state, inst, t_min=t_min, alpha=alpha, iters_per_T=iters_per_T,
+                           neighborhood=neighborhood, max_epochs=max(1, checkpoint_every),
+                           route_cache=route_cache, granular_k=granular_k, arc_filter=arc_filter)
+            save_checkpoint(checkpoint, state, inst, run_params)
+        best, best_cost, stats = sa_result(state, inst)
+        stats['checkpoint'] = {'path': checkpoint, 'every_epochs': checkpoint_every, 'resumed_epoch': resumed_epoch}
+        return best, best_cost, stats
+
+    state_start = time.monotonic()
+    state = SAState(initial_routes, inst, t_max)
+    # Końcowe `sa_result` (pełny koszt best) kosztuje tyle co inicjalizacja stanu – rezerwa budżetu
+    reserve = time.monotonic() - state_start
+    if time_limit is not None:
+        anneal_timed(state, inst, started + time_limit - reserve, t_min=t_min, alpha=alpha, iters_per_T=iters_per_T,
+                     neighborhood=neighborhood, reheat=reheat, stagnation_epochs=stagnation_epochs,
+                     route_cache=route_cache, granular_k=granular_k, arc_filter=arc_filter)
+    else:
+        anneal_segment(state, inst, t_min=t_min, alpha=alpha, iters_per_T=iters_per_T, neighborhood=neighborhood,
+                       route_cache=route_cache, granular_k=granular_k, arc_filter=arc_filter)
+    return sa_result(state, inst)
 
 # Helper dla zewnętrznego runnera (run_sa.py)
 def load_routes_json(path: str) -> List[List[int]]:  # zachowujemy dla kompatybilności zewnętrznych importów
     routes, meta = load_routes_generic(path)
     return routes, (meta or {})
 
+_INSTANCE_PARAMS = ('day_horizon', 'service_time', 'cost_per_km', 'vehicle_fixed_cost',
+                    'penalty_horizon_per_min', 'time_weight')
+
 def run_sa_core(summary_file: Optional[str], epo_times: Optional[str], time_windows_file: Optional[str] = None,
-                routes_json: Optional[str] = None, matrices_override=None, time_windows_override=None, **sa_kwargs):
+                routes_json: Optional[str] = None, matrices_override=None, time_windows_override=None,
+                chains: int = 1, workers: Optional[int] = None, exchange: str = 'pt', exchange_every: int = 5,
+                ladder: float = 0.7, **sa_kwargs):
+    """Wczytaj trasy i instancję, uruchom SA.
+
+    `chains > 1` – tryb wielołańcuchowy (`sa_parallel.parallel_tempering`) na `workers`
+    procesach; `stats` zawiera wtedy dodatkowo `chains` i `exchange`.
+    """
     meta_json = None
     if routes_json:
         # 1. Preferuj plik JSON z trasami (wynik heurystyki)
@@ -289,7 +806,7 @@ def run_sa_core(summary_file: Optional[str], epo_times: Optional[str], time_wind
         raise SystemExit("Błąd: Nie podano źródła tras (ani --routes-json, ani --summary).")
 
     if matrices_override is not None:
-        matrices = matrices_override
+        matrices = matrices_override  # słownik macierzy lub gotowy VRPInstance
     else:
         # Jeśli nie ma nadpisania, buduj z EPO
         epo_df = load_epo_times(epo_times)
@@ -305,8 +822,24 @@ def run_sa_core(summary_file: Optional[str], epo_times: Optional[str], time_wind
         else:
             time_windows, _ = load_time_windows(time_windows_file)
 
+    # Jedna niemutowalna instancja zamiast macierzy + okien + luźnych parametrów kosztu
+    instance_params = {k: sa_kwargs.pop(k) for k in _INSTANCE_PARAMS if k in sa_kwargs}
+    instance = as_instance(matrices, time_windows, **instance_params)
+
     # Uruchomienie SA z przekazaniem wszystkich pozostałych argumentów
-    best, best_cost, stats = simulated_annealing(routes, matrices, time_windows=time_windows, **sa_kwargs)
+    if chains > 1:
+        if sa_kwargs.get('time_limit') is not None:
+            raise SystemExit('Błąd: --time-limit działa tylko dla jednego łańcucha (--chains 1).')
+        if sa_kwargs.get('checkpoint') is not None:
+            raise SystemExit('Błąd: --checkpoint działa tylko dla jednego łańcucha (--chains 1).')
+        for k in ('time_limit', 'reheat', 'stagnation_epochs', 'checkpoint', 'checkpoint_every', 'resume'):
+            sa_kwargs.pop(k, None)
+        from .sa_parallel import parallel_tempering
+        best, best_cost, stats = parallel_tempering(
+            routes, instance, chains=chains, workers=workers, exchange=exchange,
+            exchange_every=exchange_every, ladder=ladder, **sa_kwargs)
+    else:
+        best, best_cost, stats = simulated_annealing(routes, instance, **sa_kwargs)
 
     # Zwróć komplet wyników, w tym trasy początkowe dla porównania
     return routes, best, best_cost, stats
@@ -0,0 +1,81 @@
+"""Przegląd parametrów oszczędności uogólnionych (λ, μ) w puli procesów.
+
+s_ij = t_0i + t_0j - λ·t_ij + μ·|t_0i - t_0j|. Składniki (`savings_terms`) liczone są raz
+w procesie głównym i trafiają do workerów jednorazowo (initializer); każdy punkt siatki
+to tylko kombinacja liniowa tablic, sortowanie i faza łączenia tras Clarke–Wright.
+Koszty wszystkich punktów liczone są jednym wywołaniem `batch_solution_costs`.
+Zwracane jest najlepsze rozwiązanie (remis: kolejność siatki) i wyniki wszystkich punktów.
+"""
+from __future__ import annotations
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+from .batch_cost import batch_solution_costs
+from .heuristic_savings import clarke_wright_savings, savings_terms
+from .robust_cost import calculate_vrp_cost_local_robust
+from .vrp_instance import VRPInstance, as_instance
+
+__all__ = ["savings_sweep", "sweep_best_routes", "DEFAULT_LAMBDAS", "DEFAULT_MUS"]
+
+DEFAULT_LAMBDAS = (0.6, 0.8, 1.0, 1.2, 1.4, 1.6, 1.8)
+DEFAULT_MUS = (0.0, 0.5, 1.0)
+
+_WORKER_STATE: Optional[tuple] = None
+
+
+def _init_worker(inst: VRPInstance, terms, heur_kwargs: Dict):
+    global _WORKER_STATE
+    _WORKER_STATE = (inst, terms, heur_kwargs)
+
+
+def _sweep_point(inst: VRPInstance, terms, heur_kwargs: Dict, lam: float, mu: float) -> Dict:
+    routes = clarke_wright_savings(inst, lam=lam, mu=mu, terms=terms, **heur_kwargs)
+    return {'lam': lam, 'mu': mu, 'cost': None, 'routes': routes, 'metrics': None}
+
+
+def _sweep_point_worker(lam: float, mu: float) -> Dict:
+    inst, terms, heur_kwargs = _WORKER_STATE
+    return _sweep_point(inst, terms, heur_kwargs, lam, mu)
+
+
+def savings_sweep(matrices: Union[Dict[str, np.ndarray], VRPInstance], time_windows=None,
+                  lambdas: Sequence[float] = DEFAULT_LAMBDAS, mus: Sequence[float] = DEFAULT_MUS,
+                  workers: Optional[int] = 1, ignore_p_constraints: bool = False,
+                  ignore_all_constraints: bool = False, **instance_params) -> Dict:
+    """Savings dla każdej pary (λ, μ) z siatki `lambdas × mus` (`workers` procesów; None = CPU).
+
+    Zwraca {'best': {'lam', 'mu', 'cost', 'routes', 'metrics'}, 'results': [...]} – wyniki
+    w kolejności siatki (punkty liczą sam koszt; 'metrics' tylko dla najlepszego).
+    Klasyczne Clarke–Wright to punkt (1.0, 0.0).
+    """
+    inst = as_instance(matrices, time_windows, **instance_params)
+    grid = [(float(lam), float(mu)) for lam in lambdas for mu in mus]
+    if not grid:
+        raise ValueError('Pusta siatka parametrów (lambdas × mus)')
+    terms = savings_terms(inst.time_E)
+    heur_kwargs = {'ignore_p_constraints': ignore_p_constraints,
+                   'ignore_all_constraints': ignore_all_constraints}
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or len(grid) == 1:
+        results = [_sweep_point(inst, terms, heur_kwargs, lam, mu) for lam, mu in grid]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(grid)), initializer=_init_worker,
+                                 initargs=(inst, terms, heur_kwargs)) as pool:
+            lams, mus_ = zip(*grid)
+            results = list(pool.map(_sweep_point_worker, lams, mus_))
+
+    for res, cost in zip(results, batch_solution_costs([r['routes'] for r in results], inst)):
+        res['cost'] = float(cost)
+    best = min(results, key=lambda r: r['cost'])
+    best['cost'], best['metrics'] = calculate_vrp_cost_local_robust(best['routes'], inst)
+    return {'best': best, 'results': results}
+
+
+def sweep_best_routes(inst: VRPInstance, workers: Optional[int] = 1, **params) -> List[List[int]]:
+    """Trasy najlepszego punktu przeglądu – postać konstruktora dla `memoized_construction`."""
+    return savings_sweep(inst, workers=workers, **params)['best']['routes']
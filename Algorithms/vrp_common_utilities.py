@@ -1,5 +1,6 @@
 from typing import Dict, Tuple, Optional
-from datetime import datetime
+from datetime import datetime, time as dt_time
+import hashlib, json, os
 import pandas as pd
 import numpy as np
 
@@ -8,6 +9,11 @@ __all__ = [
     "load_time_windows",
     "get_epo_matrix",
     "get_epo_matrices",
+    "parse_delivery_window",
+    "load_app_edge_list",
+    "load_app_edge_list_cached",
+    "app_cache_dir",
+    "file_sha1",
 ]
 
 def load_epo_times(epo_path="../wwwroot/czasy_scenariusze.csv"):
@@ -58,3 +64,152 @@ def get_epo_matrices(times_df):
         'pessimistic': get_epo_matrix(times_df, 'pessimistic'),
         'optimistic': get_epo_matrix(times_df, 'optimistic')
     }
+
+
+def parse_delivery_window(s) -> Optional[Tuple[datetime.time, datetime.time]]:
+    """Parsuje napis 'HH:MM-HH:MM' z kolumny DeliveryTimeWindow (None gdy brak/niepoprawny)."""
+    if not isinstance(s, str) or s.strip() == '' or '-' not in s:
+        return None
+    try:
+        a, b = s.split('-')
+        return datetime.strptime(a.strip(), '%H:%M').time(), datetime.strptime(b.strip(), '%H:%M').time()
+    except Exception:
+        return None
+
+def load_app_edge_list(path: str):
+    """Wczytaj edge-list w formacie aplikacji (app_*.csv).
+
+    Zwraca (matrices, time_windows):
+     - matrices: 'expected' / 'pessimistic' / 'optimistic' / 'distance_km' (n x n),
+       wypełniane wektorowo po kolumnach StartIdx/EndIdx (pętle i==j pomijane),
+     - time_windows: okno węzła j z pierwszego wiersza (kolejność pliku) z EndIdx == j;
+       każde okno parsowane jest tylko raz. Depot (0) bez okna -> None.
+    """
+    df = pd.read_csv(path)
+    start = df['StartIdx'].to_numpy(dtype=np.int64)
+    end = df['EndIdx'].to_numpy(dtype=np.int64)
+    n = int(max(start.max(), end.max())) + 1
+    off_diag = start != end
+    si = start[off_diag]; ei = end[off_diag]
+
+    def fill(values: np.ndarray) -> np.ndarray:
+        m = np.zeros((n, n))
+        m[si, ei] = values[off_diag]
+        return m
+
+    mats = {
+        'expected': fill(df['Duration_time_expected'].to_numpy(dtype=float)),
+        'pessimistic': fill(df['Duration_time_pessimistic'].to_numpy(dtype=float)),
+        'optimistic': fill(df['Duration_time_optimistic'].to_numpy(dtype=float)),
+    }
+    # Dystans fizyczny (km) – brak kolumny lub wartości nienumeryczne -> 0
+    if 'Distance_km' in df.columns:
+        dist = pd.to_numeric(df['Distance_km'], errors='coerce').fillna(0.0).to_numpy(dtype=float)
+        mats['distance_km'] = fill(dist)
+    else:
+        mats['distance_km'] = np.zeros((n, n))
+
+    time_windows: Dict[int, Optional[Tuple[datetime.time, datetime.time]]] = {}
+    if 'DeliveryTimeWindow' in df.columns:
+        firsts = df.loc[off_diag, ['EndIdx', 'DeliveryTimeWindow']].drop_duplicates('EndIdx')
+        for j, s in zip(firsts['EndIdx'].to_numpy(dtype=np.int64), firsts['DeliveryTimeWindow']):
+            time_windows[int(j)] = parse_delivery_window(s)
+    else:
+        for j in pd.unique(ei):
+            time_windows[int(j)] = None
+    if 0 not in time_windows:
+        time_windows[0] = None
+    return mats, time_windows
+
+
+# ---------------- Binarny cache instancji (memmap .npy) -----------------
+
+APP_CACHE_VERSION = 1
+_CACHE_MATRICES = ('expected', 'pessimistic', 'optimistic', 'distance_km')
+
+def file_sha1(path: str, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def app_cache_dir(path: str) -> str:
+    """Katalog cache obok CSV: app_final_20_tight.csv -> app_final_20_tight.npcache/."""
+    return os.path.splitext(path)[0] + '.npcache'
+
+def _windows_to_arrays(time_windows):
+    nodes = np.fromiter(time_windows.keys(), dtype=np.int64, count=len(time_windows))
+    bounds = np.full((len(nodes), 2), np.nan)
+    for k, tw in enumerate(time_windows.values()):
+        if tw:
+            bounds[k, 0] = tw[0].hour * 60 + tw[0].minute
+            bounds[k, 1] = tw[1].hour * 60 + tw[1].minute
+    return nodes, bounds
+
+def _windows_from_arrays(nodes, bounds):
+    time_windows: Dict[int, Optional[Tuple[datetime.time, datetime.time]]] = {}
+    for j, (a, b) in zip(nodes.tolist(), bounds.tolist()):
+        if a != a:  # NaN -> brak okna
+            time_windows[j] = None
+        else:
+            time_windows[j] = (dt_time(int(a) // 60, int(a) % 60), dt_time(int(b) // 60, int(b) % 60))
+    return time_windows
+
+def _write_app_cache(cache_dir: str, digest: str, mats, time_windows) -> None:
+    os.makedirs(cache_dir, exist_ok=True)
+    nodes, bounds = _windows_to_arrays(time_windows)
+    arrays = dict(mats, window_nodes=nodes, window_bounds=bounds)
+    pid = os.getpid()
+    for name, arr in arrays.items():
+        tmp = os.path.join(cache_dir, f'{name}.{pid}.tmp.npy')
+        np.save(tmp, np.ascontiguousarray(arr))
+        os.replace(tmp, os.path.join(cache_dir, f'{name}.npy'))
+    # meta.json zapisywany na końcu – jego obecność i hash oznaczają kompletny cache
+    tmp = os.path.join(cache_dir, f'meta.{pid}.tmp.json')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'version': APP_CACHE_VERSION, 'sha1': digest, 'n': int(mats['expected'].shape[0])}, f)
+    os.replace(tmp, os.path.join(cache_dir, 'meta.json'))
+
+def _read_app_cache(cache_dir: str, digest: str):
+    meta_path = os.path.join(cache_dir, 'meta.json')
+    if not os.path.isfile(meta_path):
+        return None
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('version') != APP_CACHE_VERSION or meta.get('sha1') != digest:
+            return None
+        mats = {k: np.load(os.path.join(cache_dir, f'{k}.npy'), mmap_mode='r') for k in _CACHE_MATRICES}
+        nodes = np.load(os.path.join(cache_dir, 'window_nodes.npy'))
+        bounds = np.load(os.path.join(cache_dir, 'window_bounds.npy'))
+    except (OSError, ValueError):
+        return None
+    return mats, _windows_from_arrays(nodes, bounds)
+
+def load_app_edge_list_cached(path: str, cache_dir: Optional[str] = None):
+    """Jak `load_app_edge_list`, ale z binarnym cache obok CSV.
+
+    Cache (katalog *.npcache z plikami .npy) jest kluczowany hashem SHA-1 zawartości CSV
+    i przebudowywany automatycznie po zmianie pliku. Macierze z cache są ładowane przez
+    np.load(mmap_mode='r') – są tylko do odczytu, także przy pierwszym wczytaniu (świeżo
+    zapisany cache jest od razu mapowany z dysku). Gdy katalogu nie da się zapisać,
+    zwracamy świeżo sparsowane macierze oznaczone jako tylko do odczytu.
+    """
+    cache_dir = cache_dir or app_cache_dir(path)
+    digest = file_sha1(path)
+    cached = _read_app_cache(cache_dir, digest)
+    if cached is not None:
+        return cached
+    mats, time_windows = load_app_edge_list(path)
+    try:
+        _write_app_cache(cache_dir, digest, mats, time_windows)
+    except OSError as e:
+        print(f'[WARN] Nie udało się zapisać cache {cache_dir}: {e}')
+    else:
+        cached = _read_app_cache(cache_dir, digest)
+        if cached is not None:
+            return cached
+    for m in mats.values():
+        m.setflags(write=False)
+    return mats, time_windows
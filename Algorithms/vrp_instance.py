@@ -0,0 +1,184 @@
+"""Niemutowalna instancja VRP (macierze + okna + parametry kosztu) w jednym obiekcie.
+
+Zamiast słownika `matrices`, słownika okien `datetime.time` i luźnych kwargs
+(`day_horizon`, `service_time`, stałe kosztowe) przekazywanych przez każde wywołanie,
+heurystyki, SA i funkcja kosztu przyjmują bezpośrednio `VRPInstance`:
+ - `travel` – jedna ciągła tablica (3, n, n): scenariusze expected / pessimistic / optimistic,
+   `time_E` / `time_P` / `time_O` to widoki na jej kolejne warstwy,
+ - `distance` – macierz km (fallback: czas expected, jak w funkcji kosztu),
+ - `window_start_min` / `window_end_min` – prekompilowane okna (`build_window_arrays`),
+ - parametry kosztu i ograniczeń,
+ - `arc_codes()` – macierz zgodności łuków (E/P) liczona leniwie przy pierwszym użyciu.
+Tablice są tylko do odczytu, obiekt używa __slots__ i tanio się pickluje (workery procesów).
+"""
+from __future__ import annotations
+import hashlib
+import json
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from .common_feasibility import ARC_VIO_E, arc_codes, build_window_arrays
+
+__all__ = ["VRPInstance", "as_instance"]
+
+_PARAM_DEFAULTS = {
+    'day_horizon': 600,
+    'service_time': 0.0,
+    'cost_per_km': 1.0,
+    'vehicle_fixed_cost': 900.0,
+    'penalty_horizon_per_min': 120.0,
+    'time_weight': 1.0,
+}
+
+
+def _readonly(arr: np.ndarray) -> np.ndarray:
+    arr.setflags(write=False)
+    return arr
+
+
+class VRPInstance:
+    __slots__ = (
+        'n', 'travel', 'time_E', 'time_P', 'time_O', 'distance',
+        'window_start_min', 'window_end_min', 'time_windows',
+        'day_horizon', 'service_time', 'cost_per_km', 'vehicle_fixed_cost',
+        'penalty_horizon_per_min', 'time_weight', 'arc_cache',
+    )
+
+    def __init__(
+        self,
+        matrices: Dict[str, np.ndarray],
+        time_windows: Optional[Dict[int, Optional[Tuple[datetime.time, datetime.time]]]] = None,
+        day_horizon: int = 600,
+        service_time: float = 0.0,
+        cost_per_km: float = 1.0,
+        vehicle_fixed_cost: float = 900.0,
+        penalty_horizon_per_min: float = 120.0,
+        time_weight: float = 1.0,
+    ):
+        time_E = matrices['expected']
+        time_O = matrices.get('optimistic')
+        travel = np.empty((3,) + time_E.shape, dtype=np.float64)
+        travel[0] = time_E
+        travel[1] = matrices['pessimistic']
+        travel[2] = time_O if time_O is not None else time_E
+        dist = matrices.get('distance_km')
+        distance = np.array(dist if dist is not None else time_E, dtype=np.float64, order='C')
+        ws, we = build_window_arrays(time_windows, time_E.shape[0])
+        _set = object.__setattr__
+        _set(self, 'n', int(time_E.shape[0]))
+        _set(self, 'travel', _readonly(travel))
+        _set(self, 'time_E', travel[0])
+        _set(self, 'time_P', travel[1])
+        _set(self, 'time_O', travel[2])
+        _set(self, 'distance', _readonly(distance))
+        _set(self, 'window_start_min', _readonly(ws))
+        _set(self, 'window_end_min', _readonly(we))
+        _set(self, 'time_windows', dict(time_windows) if time_windows else {})
+        _set(self, 'day_horizon', day_horizon)
+        _set(self, 'service_time', float(service_time))
+        _set(self, 'cost_per_km', float(cost_per_km))
+        _set(self, 'vehicle_fixed_cost', float(vehicle_fixed_cost))
+        _set(self, 'penalty_horizon_per_min', float(penalty_horizon_per_min))
+        _set(self, 'time_weight', float(time_weight))
+        _set(self, 'arc_cache', None)
+
+    # --- niemutowalność / pickle ---
+    def __setattr__(self, name, value):
+        raise AttributeError('VRPInstance jest niemutowalny – użyj with_params(...)')
+
+    def __delattr__(self, name):
+        raise AttributeError('VRPInstance jest niemutowalny')
+
+    # time_E / time_P / time_O to widoki na `travel` – nie trafiają do pickla
+    _VIEWS = ('time_E', 'time_P', 'time_O')
+    _ARRAYS = ('travel', 'distance', 'window_start_min', 'window_end_min', 'arc_cache')
+
+    def __getstate__(self):
+        return {k: getattr(self, k) for k in self.__slots__ if k not in self._VIEWS}
+
+    def __setstate__(self, state):
+        for k, v in state.items():
+            object.__setattr__(self, k, v)
+        # po unpickle tablice są świeżymi (zapisywalnymi) kopiami – przywróć tryb tylko
+        # do odczytu i odbuduj widoki na `travel`
+        for k in self._ARRAYS:
+            arr = getattr(self, k)
+            if arr is not None:
+                object.__setattr__(self, k, _readonly(np.ascontiguousarray(arr)))
+        travel = self.travel
+        object.__setattr__(self, 'time_E', travel[0])
+        object.__setattr__(self, 'time_P', travel[1])
+        object.__setattr__(self, 'time_O', travel[2])
+
+    # --- pomocnicze ---
+    @property
+    def window_arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        return self.window_start_min, self.window_end_min
+
+    @property
+    def matrices(self) -> Dict[str, np.ndarray]:
+        """Widok zgodny ze starym interfejsem słownika macierzy (bez kopiowania)."""
+        return {
+            'expected': self.time_E,
+            'pessimistic': self.time_P,
+            'optimistic': self.time_O,
+            'distance_km': self.distance,
+        }
+
+    def arc_codes(self) -> np.ndarray:
+        """Kody łuków (`common_feasibility.arc_codes`) – liczone raz dla instancji."""
+        codes = self.arc_cache
+        if codes is None:
+            codes = _readonly(arc_codes(self.time_E, self.time_P, self.window_arrays,
+                                        self.day_horizon, self.service_time))
+            object.__setattr__(self, 'arc_cache', codes)
+        return codes
+
+    def arc_compatible(self, ignore_p_constraints: bool = False) -> np.ndarray:
+        """Macierz bool łuków i->j, które mogą wystąpić w dopuszczalnej trasie
+        (`ignore_p_constraints` – tylko bit E, jak przy kontroli okien wyłącznie na osi E)."""
+        codes = self.arc_codes()
+        return (codes & ARC_VIO_E) == 0 if ignore_p_constraints else codes == 0
+
+    def cost_params(self) -> Dict[str, float]:
+        return {k: getattr(self, k) for k in _PARAM_DEFAULTS}
+
+    def fingerprint(self) -> str:
+        """SHA-1 zawartości instancji (macierze, okna, parametry) – klucz memoizacji wyników."""
+        h = hashlib.sha1()
+        for arr in (self.travel, self.distance, self.window_start_min, self.window_end_min):
+            h.update(np.ascontiguousarray(arr).tobytes())
+        h.update(json.dumps(self.cost_params(), sort_keys=True).encode('utf-8'))
+        return h.hexdigest()
+
+    def with_params(self, **params) -> 'VRPInstance':
+        """Nowa instancja z innymi parametrami; tablice są współdzielone (bez kopiowania)."""
+        unknown = set(params) - set(_PARAM_DEFAULTS)
+        if unknown:
+            raise TypeError(f'Nieznane parametry instancji: {sorted(unknown)}')
+        clone = object.__new__(VRPInstance)
+        for k in self.__slots__:
+            object.__setattr__(clone, k, params.get(k, getattr(self, k)))
+        object.__setattr__(clone, 'arc_cache', None)  # zależy od horyzontu i service_time
+        return clone
+
+    def __repr__(self):
+        return (f'VRPInstance(n={self.n}, day_horizon={self.day_horizon}, service_time={self.service_time}, '
+                f'cost_per_km={self.cost_per_km}, vehicle_fixed_cost={self.vehicle_fixed_cost}, '
+                f'penalty_horizon_per_min={self.penalty_horizon_per_min}, time_weight={self.time_weight})')
+
+
+def as_instance(matrices, time_windows=None, **params) -> VRPInstance:
+    """Instancja z `matrices`: słownik macierzy + okna + parametry albo gotowy `VRPInstance`.
+
+    Parametry równe None są pomijane (domyślne wartości / parametry instancji). Dla
+    `VRPInstance` pozostałe nadpisują jego parametry przez `with_params` – bez zmian
+    zwracany jest ten sam obiekt (wraz z cache kodów łuków).
+    """
+    params = {k: v for k, v in params.items() if v is not None}
+    if isinstance(matrices, VRPInstance):
+        overrides = {k: v for k, v in params.items() if getattr(matrices, k) != v}
+        return matrices.with_params(**overrides) if overrides else matrices
+    return VRPInstance(matrices, time_windows, **params)
@@ -13,16 +13,25 @@ Key options:
   --sizes filter sizes e.g. 20 40 80 120 200 (default: auto-detect all present)
   --window-variants filter window variants e.g. tight medium loose very_loose (default: all)
   --service-time minutes of service per visit (default 0)
+  --seed master seed of the Insertion multi-start (reproducible runs)
+  --no-memo disable the on-disk Savings memo (.heuristics_cache/ next to the CSV); Savings is deterministic,
+            so it is built once per dataset and parameters and reused by later batches
   Cost overrides: --cost-per-km --vehicle-fixed-cost --penalty-late --penalty-horizon
+  --mode pool (default) imports the heuristics once and spreads datasets over a ProcessPoolExecutor;
+         workers return structured records and the parent process writes the CSV and summary files
+  --mode subprocess legacy: one `python run_heuristics_demo.py` process per dataset
+  --workers K pool size for --mode pool (default: CPU count)
 
 Randomness description (short for thesis):
   Greedy Insertion introduces stochasticity by shuffling the customer order before successive greedy insertions.
+  Run r uses its own random stream derived from one master seed (numpy SeedSequence), so --seed reproduces a batch.
   Each run with a different permutation can yield a different constructed solution. We perform R independent
   constructions (repeat=R) and keep only the best (lowest total cost) when --best-only is specified. Clarke–Wright
   Savings is deterministic here and serves as a stable baseline. This constitutes a simple multi-start constructive
   scheme improving robustness against unlucky insertion ordering.
 """
 import argparse, os, sys, subprocess, shlex
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 ROOT = Path(__file__).parent
@@ -40,19 +49,27 @@ def parse_args():
     p.add_argument('--sizes', nargs='*', type=int, help='Filtr rozmiarów (np. 20 40 80). Domyślnie wszystkie wykryte.')
     p.add_argument('--window-variants', nargs='*', help='Filtr wariantów okien (tight medium loose very_loose).')
     p.add_argument('--service-time', type=float, default=0.0, help='Minuty obsługi per klient.')
+    p.add_argument('--no-memo', action='store_true', help='Wyłącz dyskową memoizację Savings (.heuristics_cache/ obok CSV).')
+    p.add_argument('--seed', type=int, default=None, help='Ziarno główne multi-startu Insertion (powtarzalność).')
     # Parametry kosztu
     p.add_argument('--cost-per-km', type=float, help='Nadpisz koszt za km.')
     p.add_argument('--vehicle-fixed-cost', type=float, help='Nadpisz stały koszt pojazdu.')
     p.add_argument('--penalty-late', type=float, help='Nadpisz karę za spóźnienie (min).')
     p.add_argument('--penalty-horizon', type=float, help='Nadpisz karę za przekroczenie horyzontu (min).')
+    # Tryb wykonania
+    p.add_argument('--mode', choices=['pool', 'subprocess'], default='pool',
+                   help='pool: heurystyki w puli procesów (import raz); subprocess: osobny proces na dataset.')
+    p.add_argument('--workers', type=int, default=None, help='Liczba procesów dla --mode pool (domyślnie liczba CPU).')
     return p.parse_args()
 
 
 def detect_datasets(sizes_filter, variants_filter):
     files = []
     for f in TEST_DATA.glob('app_*.csv'):
-        name = f.stem  # app_XX_variant
+        name = f.stem  # app_XX_variant lub app_final_XX_variant
         parts = name.split('_')
+        if len(parts) > 1 and parts[1] == 'final':
+            parts = parts[:1] + parts[2:]
         if len(parts) < 3:
             continue
         try:
@@ -77,6 +94,10 @@ def build_base_cmd(args):
         base.append('--best-only')
     if args.service_time:
         base += ['--service-time', str(args.service_time)]
+    if args.seed is not None:
+        base += ['--seed', str(args.seed)]
+    if args.no_memo:
+        base.append('--no-memo')
     if args.cost_per_km is not None:
         base += ['--cost-per-km', str(args.cost_per_km)]
     if args.vehicle_fixed_cost is not None:
@@ -89,26 +110,63 @@ def build_base_cmd(args):
     return base
 
 
-def main():
-    args = parse_args()
-    if not TEST_DATA.exists():
-        print(f"Brak folderu test_data: {TEST_DATA}")
-        sys.exit(1)
+def run_kwargs(args):
+    """Keyword arguments for `run_heuristics_demo.run_dataset` (in-process mode)."""
+    kw = {'repeat': args.repeat, 'best_only': args.best_only, 'service_time': args.service_time,
+          'seed': args.seed, 'verbose': False}
+    if args.cost_per_km is not None:
+        kw['cost_per_km'] = args.cost_per_km
+    if args.vehicle_fixed_cost is not None:
+        kw['vehicle_fixed_cost'] = args.vehicle_fixed_cost
+    if args.penalty_horizon is not None:
+        kw['penalty_horizon_per_min'] = args.penalty_horizon
+    return kw
 
-    if args.clean_csv and os.path.exists(args.csv):
-        os.remove(args.csv)
-        print(f"[clean] Usunięto istniejący {args.csv}")
 
-    variants_filter = args.window_variants or None
-    sizes_filter = args.sizes or None
+def run_dataset_job(path, kw):
+    """Worker entry point: one dataset -> structured record (no stdout scraping)."""
+    from run_heuristics_demo import run_dataset
+    return run_dataset(str(path), **kw)
 
-    datasets = detect_datasets(sizes_filter, variants_filter)
-    if not datasets:
-        print("Nie znaleziono datasetów (sprawdź filtry).")
-        sys.exit(1)
 
-    base_cmd = build_base_cmd(args)
+def format_record(record):
+    s, i = record['Savings'], record['Insertion']
+    return (f"Savings cost={s['cost']:.2f} vehicles={s['metrics']['vehicles_used']} | "
+            f"Insertion cost={i['cost']:.2f} vehicles={i['metrics']['vehicles_used']} "
+            f"(run {i['run_index']}/{record['repeat']})")
+
+
+def run_pool(args, datasets):
+    """Datasets spread over a process pool; the parent is the only writer of CSV and summaries."""
+    from run_heuristics_demo import csv_rows, append_csv_rows, write_summaries, memo_dir_for
+    if args.penalty_late is not None:
+        print('[WARN] --penalty-late is ignored: lateness is excluded by the E/P window filter.')
+    kw = run_kwargs(args)
+    if not args.no_memo:
+        kw['memo_dir'] = memo_dir_for(args.csv)
+    summary_dir = os.path.dirname(os.path.abspath(args.csv)) or '.'
+    ok = failed = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        # Submission order is kept when collecting, so the CSV order matches the serial runner
+        futures = [(f"app_{size}_{variant}", pool.submit(run_dataset_job, path, kw))
+                   for size, variant, path in datasets]
+        for tag, fut in futures:
+            print(f"\n== RUN {tag} ==")
+            try:
+                record = fut.result()
+            except Exception as e:
+                failed += 1
+                print(f"[EXCEPTION] {e!r}")
+                continue
+            append_csv_rows(args.csv, csv_rows(record))
+            write_summaries(record, summary_dir)
+            ok += 1
+            print(format_record(record))
+    return ok, failed
+
 
+def run_subprocesses(args, datasets):
+    base_cmd = build_base_cmd(args)
     ok = 0
     failed = 0
     for size, variant, path in datasets:
@@ -130,6 +188,31 @@ def main():
         except Exception as e:
             failed += 1
             print(f"[EXCEPTION] {e}")
+    return ok, failed
+
+
+def main():
+    args = parse_args()
+    if not TEST_DATA.exists():
+        print(f"Brak folderu test_data: {TEST_DATA}")
+        sys.exit(1)
+
+    if args.clean_csv and os.path.exists(args.csv):
+        os.remove(args.csv)
+        print(f"[clean] Usunięto istniejący {args.csv}")
+
+    variants_filter = args.window_variants or None
+    sizes_filter = args.sizes or None
+
+    datasets = detect_datasets(sizes_filter, variants_filter)
+    if not datasets:
+        print("Nie znaleziono datasetów (sprawdź filtry).")
+        sys.exit(1)
+
+    if args.mode == 'pool':
+        ok, failed = run_pool(args, datasets)
+    else:
+        ok, failed = run_subprocesses(args, datasets)
 
     print(f"\n=== PODSUMOWANIE ===")
     print(f"SUKCES: {ok} / {len(datasets)}  | NIEPOWODZENIA: {failed}")
@@ -12,8 +12,7 @@ Wypisywane są metryki funkcji local_robust.
 """
 import os, sys, argparse
 import re
-import pandas as pd
-import numpy as np
+import csv
 
 # Zapewnij działający import gdy uruchomisz poza katalogiem Algorithms
 THIS_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -26,11 +25,15 @@ if ALG_DIR not in sys.path:
     sys.path.append(ALG_DIR)
 
 from Algorithms.vrp_common_utilities import (
-    load_epo_times, load_time_windows, get_epo_matrices
+    load_epo_times, load_time_windows, get_epo_matrices, load_app_edge_list_cached
 )
 from Algorithms.robust_cost import calculate_vrp_cost_local_robust
 from Algorithms.heuristic_savings import clarke_wright_savings
-from Algorithms.heuristic_insertion import greedy_insertion
+from Algorithms.multistart import multistart_greedy
+from Algorithms.heuristic_memo import memoized_construction, MEMO_DIRNAME
+from Algorithms.savings_sweep import sweep_best_routes, DEFAULT_LAMBDAS, DEFAULT_MUS
+from functools import partial
+from Algorithms.vrp_instance import VRPInstance
 
 # Stałe kosztowe (upraszczamy interfejs – brak już flag ich zmiany)
 DAY_HORIZON = 600  # domyślny horyzont – nadpisywalny przez --day-horizon
@@ -40,45 +43,222 @@ PENALTY_HORIZON_PER_MIN = 120.0
 # Waga składnika czasowego (cost_time = TIME_WEIGHT * sum_route_time_E)
 TIME_WEIGHT = 1.0  # można łatwo zmienić w jednym miejscu
 
-def load_app_edge_list(path: str):
-    df = pd.read_csv(path)
-    max_idx = int(max(df['StartIdx'].max(), df['EndIdx'].max()))
-    n = max_idx + 1
-    mats = {
-        'expected': np.zeros((n, n)),
-        'pessimistic': np.zeros((n, n)),
-        'optimistic': np.zeros((n, n)),
-        # Dodatkowa macierz dystansów fizycznych (km) do kosztu odległości
-        'distance_km': np.zeros((n, n)),
+COMPACT_CSV_COLUMNS = [
+    'dataset', 'size', 'window_profile', 'algorithm', 'total_cost', 'vehicles_used', 'total_distance_km',
+    'waiting_total', 'avg_distance_per_route', 'avg_wait_per_client', 'lateness_P_sum', 'horizon_excess_E',
+    'makespan_E', 'sum_route_time_E', 'avg_route_time_E', 'cost_time', 'w_time',
+]
+
+
+def parse_dataset(ds_name: str):
+    m = re.match(r'app_final_(\d+)_(tight|medium|loose|very_loose)\.csv$', os.path.basename(ds_name)) if ds_name else None
+    if m:
+        return int(m.group(1)), m.group(2)
+    return None, None
+
+
+def memo_dir_for(append_csv=None, app_csv=None):
+    """Katalog memoizacji obok eksportów routes_*.json (ta sama reguła co `--export-routes-json`)."""
+    base_dir = os.path.dirname(append_csv) if append_csv else (os.path.dirname(app_csv) if app_csv else '.')
+    return os.path.join(base_dir or '.', MEMO_DIRNAME)
+
+
+def run_dataset(app_csv=None, day_horizon=DAY_HORIZON, service_time=0.0, repeat=1,
+                ignore_p=False, ignore_all=False, best_only=False,
+                cost_per_km=COST_PER_KM, vehicle_fixed_cost=VEHICLE_FIXED_COST,
+                penalty_horizon_per_min=PENALTY_HORIZON_PER_MIN, time_weight=TIME_WEIGHT, verbose=True,
+                seed=None, workers=1, target_cost=None, time_budget=None, memo_dir=None,
+                savings_knn=None, savings_sweep=False, lambdas=None, mus=None,
+                insertion_mode='random', regret_k=2):
+    """Savings + Insertion (`repeat` razy) dla jednego zbioru danych.
+
+    Insertion to multi-start (`Algorithms.multistart.multistart_greedy`): `seed` – ziarno
+    główne strumieni, `workers` – procesy, `target_cost` / `time_budget` – wczesny stop
+    (tylko z `best_only`). `memo_dir` – katalog memoizacji Savings (None = tylko pamięć procesu).
+    `savings_knn` – Savings tylko z k największymi oszczędnościami na klienta (duże instancje).
+    `savings_sweep` – Savings jako najlepszy punkt siatki (λ, μ) (`Algorithms.savings_sweep`).
+    `insertion_mode` – 'random' (multi-start) | 'cheapest' | 'regret' (z `regret_k`).
+
+    Zwraca ustrukturyzowany rekord (bez parsowania stdout):
+    {'dataset', 'app_csv', 'size', 'window_profile', 'repeat', 'input_dir',
+     'Savings': {...}, 'Insertion': {...}}, gdzie każdy algorytm to
+    {'cost', 'routes', 'metrics', 'run_index'} – najlepszy run (best_only) lub ostatni;
+    dla Insertion dodatkowo rozkład kosztów (`insertion_costs`) i `seed_entropy`.
+    """
+    if app_csv:
+        if verbose:
+            print(f"Ładowanie edge-list z {app_csv} ...")
+        matrices, time_windows = load_app_edge_list_cached(app_csv)
+        input_dir = os.path.dirname(app_csv)
+    else:
+        if verbose:
+            print("Ładowanie danych (format bazowy wwwroot)...")
+        matrices = get_epo_matrices(load_epo_times())
+        time_windows, _ = load_time_windows()
+        input_dir = '.'
+    # Jedna instancja (macierze + okna + stałe kosztowe) dla wszystkich heurystyk i oceny kosztu
+    instance = VRPInstance(
+        matrices, time_windows,
+        day_horizon=day_horizon,
+        service_time=service_time,
+        cost_per_km=cost_per_km,
+        vehicle_fixed_cost=vehicle_fixed_cost,
+        penalty_horizon_per_min=penalty_horizon_per_min,
+        time_weight=time_weight,
+    )
+
+    # Savings jest deterministyczny – liczony raz (memoizacja po instancji i parametrach,
+    # opcjonalnie na dysku w `memo_dir`); budżet `repeat` idzie tylko na Insertion.
+    savings_params = {'ignore_p_constraints': ignore_p, 'ignore_all_constraints': ignore_all}
+    if savings_sweep:
+        # Przegląd (λ, μ) oszczędności uogólnionych – najlepszy punkt siatki, punkty liczone w puli
+        savings_params['lambdas'] = list(lambdas or DEFAULT_LAMBDAS)
+        savings_params['mus'] = list(mus or DEFAULT_MUS)
+        sol_s, savings_source = memoized_construction(
+            'savings_sweep', partial(sweep_best_routes, workers=workers), instance, memo_dir=memo_dir,
+            **savings_params)
+    else:
+        if savings_knn:
+            savings_params['neighbors'] = savings_knn
+        sol_s, savings_source = memoized_construction(
+            'savings', clarke_wright_savings, instance, memo_dir=memo_dir, **savings_params)
+    cs, ms = calculate_vrp_cost_local_robust(sol_s, instance)
+    if verbose:
+        print(f"Savings: źródło wyniku = {savings_source} (memory/disk/computed)")
+
+    # Insertion: multi-start z niezależnymi strumieniami losowymi (SeedSequence)
+    if not best_only and (target_cost is not None or time_budget is not None):
+        if verbose:
+            print('[UWAGA] target_cost / time_budget działają tylko z --best-only – ignoruję.')
+        target_cost = time_budget = None
+    if insertion_mode != 'random' and repeat > 1:
+        if verbose:
+            print(f"[INFO] Insertion '{insertion_mode}' jest deterministyczny – 1 run zamiast {repeat}.")
+    ms_res = multistart_greedy(
+        instance, runs=repeat if insertion_mode == 'random' else 1, seed=seed, workers=workers,
+        mode=insertion_mode, regret_k=regret_k,
+        target_cost=target_cost, time_budget=time_budget,
+        ignore_p_constraints=ignore_p,
+        ignore_all_constraints=ignore_all,
+    )
+
+    ds_size, ds_profile = parse_dataset(app_csv) if app_csv else (None, None)
+    record = {
+        'dataset': os.path.splitext(os.path.basename(app_csv))[0] if app_csv else 'base',
+        'app_csv': app_csv,
+        'size': ds_size,
+        'window_profile': ds_profile,
+        'repeat': repeat,
+        'input_dir': input_dir,
     }
-    time_windows = {}
-    def parse_window(s):
-        if not isinstance(s, str) or s.strip() == '' or '-' not in s:
-            return None
-        a, b = s.split('-')
-        try:
-            from datetime import datetime
-            return datetime.strptime(a.strip(), '%H:%M').time(), datetime.strptime(b.strip(), '%H:%M').time()
-        except Exception:
-            return None
-    for _, row in df.iterrows():
-        i = int(row['StartIdx']); j = int(row['EndIdx'])
-        if i == j:
-            continue
-        mats['expected'][i, j] = float(row['Duration_time_expected'])
-        mats['pessimistic'][i, j] = float(row['Duration_time_pessimistic'])
-        mats['optimistic'][i, j] = float(row['Duration_time_optimistic'])
-        # Dystans fizyczny (km) – jeśli kolumna istnieje
-        if 'Distance_km' in row and not pd.isna(row['Distance_km']):
+    # run_index jak przy dawnych powtórzeniach identycznego wyniku: pierwszy (best_only) lub ostatni
+    record['Savings'] = {'cost': cs, 'routes': sol_s, 'metrics': ms, 'run_index': 1 if best_only else repeat,
+                         'memo': savings_source}
+    ins = ms_res['best'] if best_only else ms_res['results'][-1]
+    record['Insertion'] = {k: ins[k] for k in ('cost', 'routes', 'metrics', 'run_index', 'seed')}
+    if record['Insertion']['metrics'] is None:  # runy multi-startu niosą metryki tylko dla zwycięzcy
+        _, record['Insertion']['metrics'] = calculate_vrp_cost_local_robust(ins['routes'], instance)
+    record['insertion_costs'] = ms_res['costs']
+    record['insertion_runs_done'] = ms_res['runs_done']
+    record['insertion_stopped'] = ms_res['stopped']
+    record['seed_entropy'] = ms_res['seed_entropy']
+    return record
+
+
+def csv_rows(record):
+    """Kompaktowe wiersze CSV (Savings, Insertion) z rekordu `run_dataset`."""
+    rows = []
+    for label in ('Savings', 'Insertion'):
+        res = record[label]
+        metrics = res['metrics']
+        visits = sum(max(len(r)-2, 0) for r in res['routes'])
+        # Preferuj alias waiting_total jeśli istnieje
+        waiting_total_val = metrics.get('waiting_total', metrics.get('waiting_E', 0.0))
+        avg_wait = waiting_total_val / visits if visits>0 else 0.0
+        avg_distance_per_route = metrics['total_distance_km'] / metrics['vehicles_used'] if metrics['vehicles_used']>0 else 0.0
+        rows.append({
+            'dataset': record['dataset'],
+            'size': record['size'],
+            'window_profile': record['window_profile'],
+            'algorithm': label,
+            'total_cost': res['cost'],
+            'vehicles_used': metrics['vehicles_used'],
+            'total_distance_km': metrics['total_distance_km'],
+            'waiting_total': waiting_total_val,
+            'avg_distance_per_route': avg_distance_per_route,
+            'avg_wait_per_client': avg_wait,
+            'lateness_P_sum': metrics['lateness_P_sum'],
+            'horizon_excess_E': metrics['horizon_excess_E'],
+            'makespan_E': metrics.get('makespan_E', metrics.get('max_route_end_E', 0.0)),
+            'sum_route_time_E': metrics.get('sum_route_time_E', 0.0),
+            'avg_route_time_E': metrics.get('avg_route_time_E', 0.0),
+            'cost_time': metrics.get('cost_time'),
+            'w_time': metrics.get('w_time'),
+        })
+    return rows
+
+
+def append_csv_rows(path, rows):
+    """Dopisz wiersze do CSV (nagłówek gdy plik nie istnieje, ostrzeżenie gdy układ kolumn inny)."""
+    file_exists = os.path.exists(path)
+    with open(path, 'a', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=COMPACT_CSV_COLUMNS)
+        if not file_exists:
+            writer.writeheader()
+        else:
+            # ostrzeżenie jeśli nagłówek nie pasuje
             try:
-                mats['distance_km'][i, j] = float(row['Distance_km'])
+                with open(path, 'r', encoding='utf-8') as fr:
+                    first_line = fr.readline().strip().split(',')
+                if first_line != COMPACT_CSV_COLUMNS:
+                    print('[UWAGA] Istniejący plik ma inny układ kolumn – zalecane użycie nowego pliku.')
             except Exception:
-                mats['distance_km'][i, j] = 0.0
-        if j not in time_windows:
-            time_windows[j] = parse_window(row.get('DeliveryTimeWindow', ''))
-    if 0 not in time_windows:
-        time_windows[0] = None
-    return mats, time_windows
+                pass
+        for r in rows:
+            writer.writerow(r)
+
+
+def write_summaries(record, summary_dir):
+    """Pliki summary_<dataset>_<alg>_run<idx>.txt dla obu algorytmów; zwraca ich ścieżki."""
+    dataset_tag = record['dataset']
+    ds_size, ds_profile = record['size'], record['window_profile']
+    def write_summary(alg_label, cost, metrics, run_index, routes):
+        fname = f"summary_{dataset_tag}_{alg_label.lower()}_run{run_index}.txt"
+        path = os.path.join(summary_dir, fname)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f"dataset={dataset_tag}\n")
+            if ds_size is not None:
+                f.write(f"size={ds_size}\n")
+            if ds_profile is not None:
+                f.write(f"window_profile={ds_profile}\n")
+            f.write(f"algorithm={alg_label}\n")
+            f.write(f"run_index={run_index}\n")
+            f.write(f"total_cost={cost}\n")
+            core_keys = [
+                'vehicles_used','total_distance_km','waiting_total','lateness_P_sum','horizon_excess_E',
+                'makespan_E','sum_route_time_E','avg_route_time_E','cost_time','w_time','cost_distance','cost_penalty_late','cost_penalty_horizon','vehicle_cost'
+            ]
+            waiting_total_val = metrics.get('waiting_total', metrics.get('waiting_E',0.0))
+                # Wpisz kluczowe metryki (w tym nowe czasowe sum/avg route time)
+            for k in core_keys:
+                if k == 'waiting_total':
+                    f.write(f"waiting_total={waiting_total_val}\n")
+                    continue
+                if k in metrics:
+                    f.write(f"{k}={metrics[k]}\n")
+            # Lista długości tras
+            if 'route_distance_list' in metrics:
+                f.write("route_distances="+','.join(str(x) for x in metrics['route_distance_list'])+"\n")
+            if 'route_waiting_E_list' in metrics:
+                f.write("route_waiting="+','.join(str(x) for x in metrics['route_waiting_E_list'])+"\n")
+            # Pełne trasy (opcjonalnie w pracy można cytować fragmenty)
+            f.write("routes=\n")
+            for r in routes:
+                f.write(','.join(map(str, r)) + '\n')
+        return path
+    return [write_summary(label, record[label]['cost'], record[label]['metrics'],
+                          record[label]['run_index'], record[label]['routes'])
+            for label in ('Savings', 'Insertion')]
 
 
 def main():
@@ -86,7 +266,7 @@ def main():
     parser.add_argument('--app-csv', help='Ścieżka do pliku edge-list (app_*). Jeśli brak – użyje wwwroot/.')
     parser.add_argument('--day-horizon', type=int, default=600)
     parser.add_argument('--service-time', type=float, default=0.0, help='Stały czas obsługi (minuty) na każdą wizytę klienta (0 = brak).')
-    # Usuwamy seed i dynamiczne modyfikacje kosztów – spójność eksperymentów
+    # Usuwamy dynamiczne modyfikacje kosztów – spójność eksperymentów
     parser.add_argument('--append-csv', help='Ścieżka do pliku CSV – dopisz wyniki (Savings & Insertion). Tworzy nagłówek jeśli brak pliku. (stały kompaktowy zestaw kolumn)')
     parser.add_argument('--repeat', type=int, default=1, help='Ile razy powtórzyć uruchomienie (losowość w insertion).')
     parser.add_argument('--ignore-p', action='store_true', help='Ignoruj okna czasowe na osi pesymistycznej (dalej pilnuj horyzontu dnia). Eksperymentalne.')
@@ -95,76 +275,46 @@ def main():
     parser.add_argument('--save-routes', action='store_true', help='Zapisz trasy i metryki do plików (routes_*.txt) obok danych wejściowych')
     parser.add_argument('--export-routes-json', action='store_true', help='Jeśli podano: zapisz minimalne pliki routes_<dataset>_<alg>.json (interfejs wejścia dla SA).')
     parser.add_argument('--no-summary', action='store_true', help='Nie twórz plików summary_*.txt (szybszy batch, mniej plików).')
+    parser.add_argument('--savings-knn', type=int, default=None, help='Savings: tylko k największych oszczędności na klienta (pamięć/sortowanie O(n·k)).')
+    parser.add_argument('--savings-sweep', action='store_true', help='Savings uogólnione: przegląd siatki (λ, μ) w puli --workers, wybór najlepszego.')
+    parser.add_argument('--lambdas', nargs='+', type=float, default=None, help=f'Siatka λ dla --savings-sweep (domyślnie {DEFAULT_LAMBDAS}).')
+    parser.add_argument('--mus', nargs='+', type=float, default=None, help=f'Siatka μ dla --savings-sweep (domyślnie {DEFAULT_MUS}).')
+    parser.add_argument('--insertion-mode', choices=['random', 'cheapest', 'regret'], default='random', help='Insertion: losowa kolejność (multi-start) | cheapest | regret-k (deterministyczne).')
+    parser.add_argument('--regret-k', type=int, default=2, help='k dla --insertion-mode regret.')
+    parser.add_argument('--no-memo', action='store_true', help='Nie używaj dyskowej memoizacji Savings (.heuristics_cache/ obok eksportów routes_*.json).')
+    parser.add_argument('--seed', type=int, default=None, help='Ziarno główne multi-startu Insertion (SeedSequence) – powtarzalne wyniki.')
+    parser.add_argument('--workers', type=int, default=1, help='Liczba procesów dla powtórzeń Insertion (multi-start).')
+    parser.add_argument('--target-cost', type=float, default=None, help='Z --best-only: zakończ multi-start po osiągnięciu kosztu <= target.')
+    parser.add_argument('--time-budget', type=float, default=None, help='Z --best-only: limit czasu (s) multi-startu Insertion.')
     # Usunięto --diagnostics aby uprościć interfejs; zawsze zapisujemy podstawowy zestaw, szczegóły w plikach summary
     args = parser.parse_args()
 
     global DAY_HORIZON
     DAY_HORIZON = args.day_horizon  # jedyna dynamiczna zmiana
 
-    if args.app_csv:
-        print(f"Ładowanie edge-list z {args.app_csv} ...")
-        matrices, time_windows = load_app_edge_list(args.app_csv)
-        input_dir = os.path.dirname(args.app_csv)
-    else:
-        print("Ładowanie danych (format bazowy wwwroot)...")
-        matrices = get_epo_matrices(load_epo_times())
-        time_windows, _ = load_time_windows()
-        input_dir = '.'
-
-    # Multi-run handling
-    runs_s = []  # list of (cost, solution, metrics)
-    runs_i = []
-    import random as _rd  # zachowujemy losowość dla insertion (bez seeda)
-    for r_idx in range(1, args.repeat + 1):
-        # Savings (deterministyczny - ale zachowujemy dla symetrii)
-        sol_s = clarke_wright_savings(
-            matrices, time_windows,
-            day_horizon=DAY_HORIZON,
-            service_time=args.service_time,
-            ignore_p_constraints=args.ignore_p,
-            ignore_all_constraints=args.ignore_all,
-        )
-        cs, ms = calculate_vrp_cost_local_robust(
-            sol_s, matrices, time_windows,
-            day_horizon=DAY_HORIZON,
-            service_time=args.service_time,
-            cost_per_km=COST_PER_KM,
-            vehicle_fixed_cost=VEHICLE_FIXED_COST,
-            penalty_horizon_per_min=PENALTY_HORIZON_PER_MIN,
-            time_weight=TIME_WEIGHT,
-        )
-        runs_s.append((cs, sol_s, ms))
-
-        # Insertion (losowość przez shuffle)
-        sol_i = greedy_insertion(
-            matrices, time_windows,
-            day_horizon=DAY_HORIZON,
-            service_time=args.service_time,
-            cost_per_km=COST_PER_KM,
-            vehicle_fixed_cost=VEHICLE_FIXED_COST,
-            penalty_horizon_per_min=PENALTY_HORIZON_PER_MIN,
-            ignore_p_constraints=args.ignore_p,
-            ignore_all_constraints=args.ignore_all,
-        )
-        ci, mi = calculate_vrp_cost_local_robust(
-            sol_i, matrices, time_windows,
-            day_horizon=DAY_HORIZON,
-            service_time=args.service_time,
-            cost_per_km=COST_PER_KM,
-            vehicle_fixed_cost=VEHICLE_FIXED_COST,
-            penalty_horizon_per_min=PENALTY_HORIZON_PER_MIN,
-            time_weight=TIME_WEIGHT,
-        )
-        runs_i.append((ci, sol_i, mi))
-
-    # Wybór do prezentacji
-    def pick(runs):
-        if args.best_only:
-            return min(runs, key=lambda x: x[0]), runs.index(min(runs, key=lambda x: x[0]))+1
-        return runs[-1], len(runs)  # ostatni run jeśli nie best_only
-
-    (cs, sol_s, ms), idx_s = pick(runs_s)
-    (ci, sol_i, mi), idx_i = pick(runs_i)
+    record = run_dataset(
+        args.app_csv,
+        day_horizon=DAY_HORIZON,
+        service_time=args.service_time,
+        repeat=args.repeat,
+        ignore_p=args.ignore_p,
+        ignore_all=args.ignore_all,
+        best_only=args.best_only,
+        seed=args.seed,
+        workers=args.workers,
+        target_cost=args.target_cost,
+        time_budget=args.time_budget,
+        memo_dir=None if args.no_memo else memo_dir_for(args.append_csv, args.app_csv),
+        savings_knn=args.savings_knn,
+        savings_sweep=args.savings_sweep,
+        lambdas=args.lambdas,
+        mus=args.mus,
+        insertion_mode=args.insertion_mode,
+        regret_k=args.regret_k,
+    )
+    input_dir = record['input_dir']
+    cs, sol_s, ms, idx_s = (record['Savings'][k] for k in ('cost', 'routes', 'metrics', 'run_index'))
+    ci, sol_i, mi, idx_i = (record['Insertion'][k] for k in ('cost', 'routes', 'metrics', 'run_index'))
 
     print(f"\nHeurystyka: Clarke–Wright Savings (run_index={idx_s}/{args.repeat})")
     print("Routes:", sol_s)
@@ -173,6 +323,10 @@ def main():
     print("Metrics:", ms_print)
 
     print(f"\nHeurystyka: Greedy Insertion (run_index={idx_i}/{args.repeat})")
+    costs_i = record['insertion_costs']
+    print(f"Multi-start: {record['insertion_runs_done']}/{args.repeat} runów, koszt min={min(costs_i):.2f} "
+          f"śr={sum(costs_i)/len(costs_i):.2f} max={max(costs_i):.2f}, stop={record['insertion_stopped']}, "
+          f"seed_entropy={record['seed_entropy']}")
     print("Routes:", sol_i)
     print("Cost:", ci)
     mi_print = {k:v for k,v in mi.items() if not k.startswith('route_') and k not in ('max_route_end_P',)}
@@ -277,106 +431,13 @@ def main():
 
     # CSV append (wybrany podzbiór metryk)
     if args.append_csv:
-        import csv as _csv, os as _os
-        # Kompaktowy stały zestaw kolumn
-        def parse_dataset(ds_name: str):
-            m = re.match(r'app_final_(\d+)_(tight|medium|loose|very_loose)\.csv$', os.path.basename(ds_name)) if ds_name else None
-            if m:
-                return int(m.group(1)), m.group(2)
-            return None, None
-        ds_size, ds_profile = parse_dataset(args.app_csv) if args.app_csv else (None, None)
-
-        def extract_row(label, cost, metrics, run_index):
-            solution = sol_s if label=='Savings' else sol_i
-            visits = sum(max(len(r)-2, 0) for r in solution)
-            # Preferuj alias waiting_total jeśli istnieje
-            waiting_total_val = metrics.get('waiting_total', metrics.get('waiting_E', 0.0))
-            avg_wait = waiting_total_val / visits if visits>0 else 0.0
-            avg_distance_per_route = metrics['total_distance_km'] / metrics['vehicles_used'] if metrics['vehicles_used']>0 else 0.0
-            cost_time_val = metrics.get('cost_time')
-            w_time_val = metrics.get('w_time')
-            return {
-                'dataset': os.path.splitext(os.path.basename(args.app_csv))[0] if args.app_csv else 'base',
-                'size': ds_size,
-                'window_profile': ds_profile,
-                'algorithm': label,
-                'total_cost': cost,
-                'vehicles_used': metrics['vehicles_used'],
-                'total_distance_km': metrics['total_distance_km'],
-                'waiting_total': waiting_total_val,
-                'avg_distance_per_route': avg_distance_per_route,
-                'avg_wait_per_client': avg_wait,
-                'lateness_P_sum': metrics['lateness_P_sum'],
-                'horizon_excess_E': metrics['horizon_excess_E'],
-                'makespan_E': metrics.get('makespan_E', metrics.get('max_route_end_E', 0.0)),
-                'sum_route_time_E': metrics.get('sum_route_time_E', 0.0),
-                'avg_route_time_E': metrics.get('avg_route_time_E', 0.0),
-                'cost_time': cost_time_val,
-                'w_time': w_time_val,
-            }
-        rows = [
-            extract_row('Savings', cs, ms, idx_s),
-            extract_row('Insertion', ci, mi, idx_i)
-        ]
-        file_exists = _os.path.exists(args.append_csv)
-        with open(args.append_csv, 'a', newline='', encoding='utf-8') as f:
-            fieldnames = list(rows[0].keys())
-            writer = _csv.DictWriter(f, fieldnames=fieldnames)
-            if not file_exists:
-                writer.writeheader()
-            else:
-                # ostrzeżenie jeśli nagłówek nie pasuje
-                try:
-                    with open(args.append_csv, 'r', encoding='utf-8') as fr:
-                        first_line = fr.readline().strip().split(',')
-                    if first_line != fieldnames:
-                        print('[UWAGA] Istniejący plik ma inny układ kolumn – zalecane użycie nowego pliku.')
-                except Exception:
-                    pass
-            for r in rows:
-                writer.writerow(r)
+        append_csv_rows(args.append_csv, csv_rows(record))
         print(f"Dopisano wyniki do CSV: {args.append_csv}")
 
         # Tworzymy dodatkowe pliki podsumowań (summary_*.txt) w tym samym katalogu co CSV
         summary_dir = os.path.dirname(os.path.abspath(args.append_csv)) or '.'
-        dataset_tag = os.path.splitext(os.path.basename(args.app_csv))[0] if args.app_csv else 'base'
-        def write_summary(alg_label, cost, metrics, run_index, routes):
-            fname = f"summary_{dataset_tag}_{alg_label.lower()}_run{run_index}.txt"
-            path = os.path.join(summary_dir, fname)
-            with open(path, 'w', encoding='utf-8') as f:
-                f.write(f"dataset={dataset_tag}\n")
-                if ds_size is not None:
-                    f.write(f"size={ds_size}\n")
-                if ds_profile is not None:
-                    f.write(f"window_profile={ds_profile}\n")
-                f.write(f"algorithm={alg_label}\n")
-                f.write(f"run_index={run_index}\n")
-                f.write(f"total_cost={cost}\n")
-                core_keys = [
-                    'vehicles_used','total_distance_km','waiting_total','lateness_P_sum','horizon_excess_E',
-                    'makespan_E','sum_route_time_E','avg_route_time_E','cost_time','w_time','cost_distance','cost_penalty_late','cost_penalty_horizon','vehicle_cost'
-                ]
-                waiting_total_val = metrics.get('waiting_total', metrics.get('waiting_E',0.0))
-                    # Wpisz kluczowe metryki (w tym nowe czasowe sum/avg route time)
-                for k in core_keys:
-                    if k == 'waiting_total':
-                        f.write(f"waiting_total={waiting_total_val}\n")
-                        continue
-                    if k in metrics:
-                        f.write(f"{k}={metrics[k]}\n")
-                # Lista długości tras
-                if 'route_distance_list' in metrics:
-                    f.write("route_distances="+','.join(str(x) for x in metrics['route_distance_list'])+"\n")
-                if 'route_waiting_E_list' in metrics:
-                    f.write("route_waiting="+','.join(str(x) for x in metrics['route_waiting_E_list'])+"\n")
-                # Pełne trasy (opcjonalnie w pracy można cytować fragmenty)
-                f.write("routes=\n")
-                for r in routes:
-                    f.write(','.join(map(str, r)) + '\n')
-            return path
         if not args.no_summary:
-            p1 = write_summary('Savings', cs, ms, idx_s, sol_s)
-            p2 = write_summary('Insertion', ci, mi, idx_i, sol_i)
+            p1, p2 = write_summaries(record, summary_dir)
             print(f"Zapisano podsumowania: {p1}, {p2}")
         else:
             print("(Pomijam pliki summary – --no-summary)")
@@ -2,12 +2,17 @@
 Użycie:
 python run_sa.py --summary summary_app_20_loose_insertion_run1.txt --epo wwwroot/czasy_scenariusze.csv \
     --t-max 1500 --t-min 1 --alpha 0.9 --iters 500 --neigh mixed --seed 42
+Tryb wielołańcuchowy (parallel tempering na 8 procesach):
+python run_sa.py --routes-json routes.json --app-csv app.csv --chains 8 --workers 8 --exchange pt
+Długi przebieg z checkpointem (po przerwaniu ta sama komenda z --resume kontynuuje):
+python run_sa.py --routes-json routes.json --app-csv app.csv --seed 1 --checkpoint sa_ckpt.json --resume
 """
 from __future__ import annotations
 import argparse
 import time
 import os
 from Algorithms.sa_vrp import run_sa_core
+from Algorithms.vrp_common_utilities import load_app_edge_list_cached
 
 
 def build_parser():
@@ -27,6 +32,31 @@ def build_parser():
     p.add_argument('--save-best', default=None, help='Zapisz najlepsze trasy do pliku (opcjonalnie)')
     p.add_argument('--time-weight', type=float, default=1.0, help='Waga składnika cost_time (sum_route_time_E).')
     p.add_argument('--save-csv', help='Opcjonalnie: zapis metryk do pliku CSV (append).')
+    p.add_argument('--seed', type=int, default=None, help='Ziarno generatora (powtarzalność).')
+    p.add_argument('--route-cache', type=int, default=0,
+                   help='Rozmiar cache LRU klasyfikacji i kosztu tras (0 = wyłączony).')
+    p.add_argument('--granular-k', type=int, default=0,
+                   help='Granularne swap/relocate: tylko obok k najbliższych sąsiadów (0 = wyłączone).')
+    p.add_argument('--time-limit', type=float, default=None, metavar='SECONDS',
+                   help='Budżet czasu SA: harmonogram chłodzenia dopasowany do zmierzonego tempa (--alpha tylko na start).')
+    p.add_argument('--reheat', type=float, default=0.0,
+                   help='Z --time-limit: przy stagnacji T wraca do reheat*t_max (0 = bez ponownego grzania).')
+    p.add_argument('--stagnation-epochs', type=int, default=20,
+                   help='Z --reheat: liczba epok bez poprawy best, po której następuje ponowne grzanie.')
+    p.add_argument('--checkpoint', default=None, metavar='PATH',
+                   help='Plik checkpointu SA (JSON, zapis atomowy co --checkpoint-every epok).')
+    p.add_argument('--checkpoint-every', type=int, default=10, help='Co ile epok zapisywać checkpoint.')
+    p.add_argument('--resume', action='store_true',
+                   help='Wznów przebieg z --checkpoint (te same trasy wejściowe, instancja i parametry SA).')
+    p.add_argument('--arc-filter', action='store_true',
+                   help='Wstępne odrzucanie ruchów po macierzy zgodności łuków (liczniki naruszeń przybliżone).')
+    # Tryb wielołańcuchowy (Algorithms/sa_parallel.py)
+    p.add_argument('--chains', type=int, default=1, help='Liczba łańcuchów SA (>1 = tryb równoległy).')
+    p.add_argument('--workers', type=int, default=None, help='Liczba procesów (domyślnie min(chains, CPU)).')
+    p.add_argument('--exchange', choices=['pt', 'elite', 'none'], default='pt',
+                   help='Wymiana między łańcuchami: parallel tempering | migracja elity | brak.')
+    p.add_argument('--exchange-every', type=int, default=5, help='Co ile epok wymiana stanów między łańcuchami.')
+    p.add_argument('--ladder', type=float, default=0.7, help='Drabina temperatur: łańcuch c startuje z t_max*ladder^c.')
     return p
 
 
@@ -44,53 +74,18 @@ def main():
     matrices_override = None
     time_windows_override = None
 
-    def load_app_edge_list(path: str):
-        import pandas as pd, numpy as np, datetime
-        df = pd.read_csv(path)
-        max_idx = int(max(df['StartIdx'].max(), df['EndIdx'].max()))
-        n = max_idx + 1
-        mats = {
-            'expected': np.zeros((n, n)),
-            'pessimistic': np.zeros((n, n)),
-            'optimistic': np.zeros((n, n)),
-            'distance_km': np.zeros((n, n)),
-        }
-        time_windows = {}
-        def parse_window(s):
-            if not isinstance(s, str) or s.strip() == '' or '-' not in s:
-                return None
-            a, b = s.split('-')
-            try:
-                from datetime import datetime as _dt
-                return _dt.strptime(a.strip(), '%H:%M').time(), _dt.strptime(b.strip(), '%H:%M').time()
-            except Exception:
-                return None
-        for _, row in df.iterrows():
-            i = int(row['StartIdx']); j = int(row['EndIdx'])
-            if i == j:
-                continue
-            mats['expected'][i, j] = float(row['Duration_time_expected'])
-            mats['pessimistic'][i, j] = float(row['Duration_time_pessimistic'])
-            mats['optimistic'][i, j] = float(row['Duration_time_optimistic'])
-            if 'Distance_km' in row and not pd.isna(row['Distance_km']):
-                try:
-                    mats['distance_km'][i, j] = float(row['Distance_km'])
-                except Exception:
-                    pass
-            if j not in time_windows:
-                time_windows[j] = parse_window(row.get('DeliveryTimeWindow', ''))
-        if 0 not in time_windows:
-            time_windows[0] = None
-        return mats, time_windows
-
     if routes_json:
         summary_file = None
         if args.app_csv:
-            matrices_override, time_windows_override = load_app_edge_list(args.app_csv)
+            matrices_override, time_windows_override = load_app_edge_list_cached(args.app_csv)
         else:
             print('[INFO] Używasz --routes-json bez --app-csv: pozostaję przy macierzach z EPO (upewnij się, że zawierają pełny zakres indeksów).')
     if not args.app_csv and not args.epo:
         raise SystemExit('Musisz podać --epo jeśli nie ma --app-csv (brak źródła macierzy).')
+    if args.resume and not args.checkpoint:
+        raise SystemExit('--resume wymaga --checkpoint.')
+    if args.checkpoint and args.time_limit is not None:
+        raise SystemExit('--checkpoint nie łączy się z --time-limit.')
 
     start_time = time.time()
     init_routes, best_routes, best_cost, stats = run_sa_core(
@@ -110,8 +105,22 @@ def main():
         alpha=args.alpha,
         iters_per_T=args.iters,
         neighborhood=args.neigh,
-        seed=None,
+        seed=args.seed,
         time_weight=args.time_weight,
+        chains=args.chains,
+        workers=args.workers,
+        exchange=args.exchange,
+        exchange_every=args.exchange_every,
+        ladder=args.ladder,
+        route_cache_size=args.route_cache,
+        granular_k=args.granular_k,
+        arc_filter=args.arc_filter,
+        time_limit=args.time_limit,
+        reheat=args.reheat,
+        stagnation_epochs=args.stagnation_epochs,
+        checkpoint=args.checkpoint,
+        checkpoint_every=args.checkpoint_every,
+        resume=args.resume,
     )
     # Domyślnie nie drukujemy initial (minimalny interfejs)
     wall_time = time.time() - start_time
@@ -122,6 +131,21 @@ def main():
     print('Rejected (horizon) moves:', stats.get('rejected_horizon'))
     print('Rejected (window E) moves:', stats.get('rejected_window_E'))
     print('Rejected (window P) moves:', stats.get('rejected_window_P'))
+    if stats.get('checkpoint'):
+        ck = stats['checkpoint']
+        resumed = f"resumed from epoch {ck['resumed_epoch']}" if ck['resumed_epoch'] is not None else 'fresh run'
+        print(f"Checkpoint: {ck['path']} (every {ck['every_epochs']} epochs, {resumed})")
+    if args.time_limit is not None:
+        print(f"Time limit: {args.time_limit:.2f}s | wall {wall_time:.2f}s | epochs {stats.get('epochs')} | reheats {stats.get('reheats')}")
+    if args.route_cache > 0:
+        hits, misses = stats.get('route_cache_hits', 0), stats.get('route_cache_misses', 0)
+        rate = hits / (hits + misses) if hits + misses else 0.0
+        print(f'Route cache: {hits} hits / {misses} misses ({rate:.1%})')
+    if stats.get('chains'):
+        ex = stats['exchange']
+        print(f"Chains: {len(stats['chains'])} | exchange={ex['mode']} accepted {ex['accepted']}/{ex['attempted']} | best chain: {stats['best_chain']}")
+        for cs in stats['chains']:
+            print(f"  chain {cs['chain']}: T0={cs['t_start']:.1f} best={cs['best_cost']:.2f} accepted={cs['accepted_moves']}")
     init_m = stats.get('initial_metrics') or {}
     best_m = stats.get('best_metrics') or {}
     # Podstawowy zestaw kluczy (minimalny do analizy i prezentacji)
@@ -162,6 +186,12 @@ def main():
             'neighborhood': args.neigh,
             'day_horizon': args.day_horizon,
             'time_weight': args.time_weight,
+            'seed': args.seed,
+            'granular_k': args.granular_k,
+            'time_limit': args.time_limit,
+            'reheat': args.reheat if args.time_limit is not None else None,
+            'chains': args.chains,
+            'exchange': args.exchange if args.chains > 1 else None,
             'routes_source': os.path.basename(routes_json) if routes_json else os.path.basename(summary_file) if summary_file else None,
             'matrices_source': os.path.basename(args.app_csv) if args.app_csv else os.path.basename(args.epo) if args.epo else None,
         }
@@ -175,15 +205,21 @@ def main():
             'process': {
                 'runtime_seconds': wall_time,
                 'epochs': stats.get('epochs'),
+                'reheats': stats.get('reheats'),
                 'accepted_moves': stats.get('accepted_moves'),
                 'improving_moves': stats.get('improving_moves'),
                 'rejected_horizon_moves': stats.get('rejected_horizon'),
                 'rejected_window_E_moves': stats.get('rejected_window_E'),
                 'rejected_window_P_moves': stats.get('rejected_window_P'),
                 'rejected_horizon_rate': (stats.get('rejected_horizon')/stats.get('total_attempts')) if stats.get('total_attempts') else None,
+                'route_cache_hits': stats.get('route_cache_hits'),
+                'route_cache_misses': stats.get('route_cache_misses'),
             },
             'trace_improvements': improvement_trace,
         }
+        if stats.get('chains'):
+            payload['chains'] = stats['chains']
+            payload['process']['exchange'] = stats['exchange']
         with open(args.save_best, 'w', encoding='utf-8') as f:
             json.dump(payload, f, ensure_ascii=False, indent=2)
         print('Saved results (slim JSON) ->', args.save_best)
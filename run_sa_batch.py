@@ -7,19 +7,30 @@ Użycie (przykład):
       --alpha 0.90 0.95 0.98 \
       --iters-per-T 300 500 \
       --neighborhood swap relocate two_opt mixed \
-      --output sa_batch_results.csv
+      --output sa_batch_results.csv --workers 8 --resume
 
 Opis:
 - Szuka plików routes_app_final_*_best.json w katalogu --routes-dir.
 - Do rekonstrukcji macierzy czasów używa odpowiadających im plików app_final_<size>_<profile>.csv z --app-dir.
 - Uruchamia SA dla każdej kombinacji parametrów.
 - Zapisuje wiersze do CSV (append) z kluczowymi metrykami i improvement_pct.
+  Plik ze starszym nagłówkiem (podzbiór kolumn) jest najpierw przepisywany do bieżącego
+  układu; plik z innymi kolumnami jest odrzucany.
+- --workers K: komórki siatki liczone równolegle w puli procesów; wiersze CSV zapisuje
+  wyłącznie proces główny (jeden writer, flush po każdym wierszu).
+- --resume: pomija komórki (dataset, parametry) obecne już w --output – po awarii lub
+  Ctrl-C traci się tylko komórki, które były w trakcie liczenia.
+- --time-limit S: każda komórka dostaje budżet S sekund (harmonogram dopasowany do tempa,
+  --alpha tylko na start); --reheat R: ponowne grzanie do R*t_max przy stagnacji.
 
 Aby ograniczyć czas, zmniejsz siatkę (np. tylko 2 wartości alpha i 1 iters-per-T).
 """
 from __future__ import annotations
 import argparse, os, re, csv, time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from Algorithms.sa_vrp import run_sa_core
+from Algorithms.vrp_common_utilities import load_app_edge_list_cached
+from Algorithms.vrp_instance import VRPInstance
 
 # Parametry kosztowe zgodne z heurystykami
 SERVICE_TIME = 0.0
@@ -30,45 +41,16 @@ DAY_HORIZON_DEFAULT = 600
 
 ROUTE_PATTERN = re.compile(r"routes_app_final_(\d+)_(very_loose|loose|medium|tight)_best\.json$")
 
+CSV_COLS = [
+    'dataset','size','window_profile','t_max','t_min','alpha','iters_per_T','neighborhood',
+    'day_horizon','time_weight','initial_cost','best_cost','improvement_pct',
+    'vehicles_initial','vehicles_best','distance_initial','distance_best',
+    'makespan_initial','makespan_best','waiting_initial','waiting_best',
+    'accepted_moves','improving_moves','epochs','runtime_seconds','time_limit','reheat'
+]
 
-def load_app_edge_list(path: str):
-    import pandas as pd, numpy as np
-    df = pd.read_csv(path)
-    max_idx = int(max(df['StartIdx'].max(), df['EndIdx'].max()))
-    n = max_idx + 1
-    mats = {
-        'expected': np.zeros((n, n)),
-        'pessimistic': np.zeros((n, n)),
-        'optimistic': np.zeros((n, n)),
-        'distance_km': np.zeros((n, n)),
-    }
-    time_windows = {}
-    def parse_window(s):
-        if not isinstance(s, str) or s.strip() == '' or '-' not in s:
-            return None
-        a, b = s.split('-')
-        from datetime import datetime as _dt
-        try:
-            return _dt.strptime(a.strip(), '%H:%M').time(), _dt.strptime(b.strip(), '%H:%M').time()
-        except Exception:
-            return None
-    for _, row in df.iterrows():
-        i = int(row['StartIdx']); j = int(row['EndIdx'])
-        if i == j:
-            continue
-        mats['expected'][i, j] = float(row['Duration_time_expected'])
-        mats['pessimistic'][i, j] = float(row['Duration_time_pessimistic'])
-        mats['optimistic'][i, j] = float(row['Duration_time_optimistic'])
-        if 'Distance_km' in row and not pd.isna(row['Distance_km']):
-            try:
-                mats['distance_km'][i, j] = float(row['Distance_km'])
-            except Exception:
-                pass
-        if j not in time_windows:
-            time_windows[j] = parse_window(row.get('DeliveryTimeWindow', ''))
-    if 0 not in time_windows:
-        time_windows[0] = None
-    return mats, time_windows
+# Instancje budowane raz na dataset i proces – wspólne dla całej siatki parametrów
+_INSTANCES = {}
 
 
 def collect_route_files(routes_dir: str):
@@ -81,6 +63,165 @@ def collect_route_files(routes_dir: str):
     return sorted(out)
 
 
+def _opt_float(value):
+    return None if value in (None, '') else float(value)
+
+
+def cell_key(dataset, t_max, t_min, alpha, iters, neigh, day_horizon, time_weight, time_limit=None, reheat=None):
+    """Klucz komórki siatki – znormalizowany, by porównywać z wartościami odczytanymi z CSV
+    (puste time_limit / reheat – wiersze sprzed trybu budżetu czasu)."""
+    time_limit = _opt_float(time_limit)
+    reheat = _opt_float(reheat) if time_limit is not None else None
+    return (str(dataset), float(t_max), float(t_min), float(alpha), int(iters), str(neigh),
+            int(day_horizon), float(time_weight), time_limit, reheat)
+
+
+def load_done_keys(path: str) -> set:
+    """Klucze komórek już zapisanych w CSV (tryb --resume). Uszkodzone wiersze są pomijane."""
+    done = set()
+    if not os.path.isfile(path):
+        return done
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            try:
+                done.add(cell_key(row['dataset'], row['t_max'], row['t_min'], row['alpha'],
+                                  row['iters_per_T'], row['neighborhood'], row['day_horizon'],
+                                  row['time_weight'], row.get('time_limit'), row.get('reheat')))
+            except (KeyError, TypeError, ValueError):
+                continue
+    return done
+
+
+def ensure_csv_header(path: str) -> bool:
+    """Sprawdź nagłówek istniejącego CSV względem `CSV_COLS`; zwraca True, gdy trzeba go dopisać.
+
+    Plik ze starszym układem (podzbiór `CSV_COLS`, np. bez time_limit / reheat) jest przepisywany
+    atomowo z nowym nagłówkiem – brakujące kolumny starych wierszy zostają puste. Inny układ
+    kolumn kończy program: dopisywanie wierszy pod obcy nagłówek rozjechałoby plik.
+    """
+    if not os.path.isfile(path) or os.path.getsize(path) == 0:
+        return True
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        header = reader.fieldnames or []
+        if header == CSV_COLS:
+            return False
+        if not set(header) <= set(CSV_COLS):
+            raise SystemExit(f'Plik {path} ma inny układ kolumn niż CSV_COLS – podaj nowy plik --output.')
+        rows = list(reader)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_COLS, restval='')
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp, path)
+    print(f'[CSV] Przepisano {path} do nowego układu kolumn ({len(rows)} wierszy).')
+    return False
+
+
+def get_instance(app_csv: str, day_horizon: int, time_weight: float) -> VRPInstance:
+    key = (app_csv, day_horizon, time_weight)
+    inst = _INSTANCES.get(key)
+    if inst is None:
+        matrices, time_windows = load_app_edge_list_cached(app_csv)
+        inst = _INSTANCES[key] = VRPInstance(
+            matrices, time_windows,
+            day_horizon=day_horizon,
+            service_time=SERVICE_TIME,
+            cost_per_km=COST_PER_KM,
+            vehicle_fixed_cost=VEHICLE_FIXED_COST,
+            penalty_horizon_per_min=PENALTY_HORIZON,
+            time_weight=time_weight,
+        )
+    return inst
+
+
+def run_cell(cell: dict) -> dict:
+    """Jedna komórka siatki: SA dla (dataset, t_max, alpha, iters, neigh) -> wiersz CSV."""
+    instance = get_instance(cell['app_csv'], cell['day_horizon'], cell['time_weight'])
+    start = time.time()
+    init_routes, best_routes, best_cost, stats = run_sa_core(
+        summary_file=None,
+        routes_json=cell['route_path'],
+        epo_times=None,  # korzystamy z override
+        time_windows_file=None,
+        matrices_override=instance,
+        t_max=cell['t_max'],
+        t_min=cell['t_min'],
+        alpha=cell['alpha'],
+        iters_per_T=cell['iters_per_T'],
+        neighborhood=cell['neighborhood'],
+        seed=None,
+        time_limit=cell['time_limit'],
+        reheat=cell['reheat'] or 0.0,
+    )
+    wall = time.time() - start
+    init_m = stats.get('initial_metrics') or {}
+    best_m = stats.get('best_metrics') or {}
+    initial_cost = stats.get('initial_cost')
+    improvement_pct = (initial_cost - best_cost)/initial_cost if initial_cost else None
+    return {
+        'dataset': cell['dataset'],
+        'size': cell['size'],
+        'window_profile': cell['window_profile'],
+        't_max': cell['t_max'],
+        't_min': cell['t_min'],
+        'alpha': cell['alpha'],
+        'iters_per_T': cell['iters_per_T'],
+        'neighborhood': cell['neighborhood'],
+        'day_horizon': cell['day_horizon'],
+        'time_weight': cell['time_weight'],
+        'initial_cost': initial_cost,
+        'best_cost': best_cost,
+        'improvement_pct': improvement_pct,
+        'vehicles_initial': init_m.get('vehicles_used'),
+        'vehicles_best': best_m.get('vehicles_used'),
+        'distance_initial': init_m.get('total_distance_km'),
+        'distance_best': best_m.get('total_distance_km'),
+        'makespan_initial': init_m.get('makespan_E'),
+        'makespan_best': best_m.get('makespan_E'),
+        'waiting_initial': init_m.get('waiting_E'),
+        'waiting_best': best_m.get('waiting_E'),
+        'accepted_moves': stats.get('accepted_moves'),
+        'improving_moves': stats.get('improving_moves'),
+        'epochs': stats.get('epochs'),
+        'runtime_seconds': wall,
+        'time_limit': cell['time_limit'],
+        'reheat': cell['reheat'],
+    }
+
+
+def build_cells(args, route_specs, done: set):
+    """Lista komórek siatki do policzenia oraz liczba pominiętych (--resume)."""
+    cells = []
+    skipped = 0
+    reheat = args.reheat if args.time_limit is not None else None
+    for size, profile, route_path in route_specs:
+        dataset_tag = f'app_final_{size}_{profile}'
+        app_csv = os.path.join(args.app_dir, f'app_final_{size}_{profile}.csv')
+        if not os.path.isfile(app_csv):
+            print(f'[WARN] Brak pliku macierzy: {app_csv} – pomijam instancję {dataset_tag}')
+            continue
+        for t_max in args.t_max:
+            for alpha in args.alpha:
+                for iters in args.iters_per_T:
+                    for neigh in args.neighborhood:
+                        key = cell_key(dataset_tag, t_max, args.t_min, alpha, iters, neigh,
+                                       args.day_horizon, args.time_weight, args.time_limit, reheat)
+                        if key in done:
+                            skipped += 1
+                            continue
+                        cells.append({
+                            'dataset': dataset_tag, 'size': size, 'window_profile': profile,
+                            'route_path': route_path, 'app_csv': app_csv,
+                            't_max': t_max, 't_min': args.t_min, 'alpha': alpha,
+                            'iters_per_T': iters, 'neighborhood': neigh,
+                            'day_horizon': args.day_horizon, 'time_weight': args.time_weight,
+                            'time_limit': args.time_limit, 'reheat': reheat,
+                        })
+    return cells, skipped
+
+
 def build_parser():
     p = argparse.ArgumentParser(description='Batch SA over best heuristic solutions')
     p.add_argument('--routes-dir', required=True, help='Katalog z plikami routes_*_best.json')
@@ -94,6 +235,12 @@ def build_parser():
     p.add_argument('--time-weight', type=float, default=1.0)
     p.add_argument('--output', required=True, help='CSV wynikowy (append lub tworzy)')
     p.add_argument('--limit', type=int, default=None, help='Opcjonalny limit liczby instancji do szybkiego testu')
+    p.add_argument('--workers', type=int, default=1, help='Liczba procesów liczących komórki siatki (1 = sekwencyjnie)')
+    p.add_argument('--resume', action='store_true', help='Pomiń komórki obecne już w pliku --output')
+    p.add_argument('--time-limit', type=float, default=None, metavar='SECONDS',
+                   help='Budżet czasu na komórkę (harmonogram chłodzenia dopasowany do tempa)')
+    p.add_argument('--reheat', type=float, default=0.0,
+                   help='Z --time-limit: ponowne grzanie do reheat*t_max przy stagnacji (0 = wyłączone)')
     return p
 
 
@@ -105,89 +252,46 @@ def main():
     if args.limit:
         route_specs = route_specs[:args.limit]
 
-    csv_cols = [
-        'dataset','size','window_profile','t_max','t_min','alpha','iters_per_T','neighborhood',
-        'day_horizon','time_weight','initial_cost','best_cost','improvement_pct',
-        'vehicles_initial','vehicles_best','distance_initial','distance_best',
-        'makespan_initial','makespan_best','waiting_initial','waiting_best',
-        'accepted_moves','improving_moves','epochs','runtime_seconds'
-    ]
-    write_header = not os.path.isfile(args.output)
+    write_header = ensure_csv_header(args.output)
+    done = load_done_keys(args.output) if args.resume else set()
+    cells, skipped = build_cells(args, route_specs, done)
+    if skipped:
+        print(f'[RESUME] Pominięto {skipped} komórek obecnych w {args.output}; pozostało {len(cells)}.')
 
+    total_jobs = 0
     with open(args.output, 'a', newline='', encoding='utf-8') as f_csv:
-        writer = csv.DictWriter(f_csv, fieldnames=csv_cols)
+        writer = csv.DictWriter(f_csv, fieldnames=CSV_COLS)
         if write_header:
             writer.writeheader()
+            f_csv.flush()
 
-        total_jobs = 0
-        for size, profile, route_path in route_specs:
-            dataset_tag = f'app_final_{size}_{profile}'
-            app_csv = os.path.join(args.app_dir, f'app_final_{size}_{profile}.csv')
-            if not os.path.isfile(app_csv):
-                print(f'[WARN] Brak pliku macierzy: {app_csv} – pomijam instancję {dataset_tag}')
-                continue
-            matrices, time_windows = load_app_edge_list(app_csv)
-
-            for t_max in args.t_max:
-                for alpha in args.alpha:
-                    for iters in args.iters_per_T:
-                        for neigh in args.neighborhood:
-                            total_jobs += 1
-                            start = time.time()
-                            init_routes, best_routes, best_cost, stats = run_sa_core(
-                                summary_file=None,
-                                routes_json=route_path,
-                                epo_times=None,  # korzystamy z override
-                                time_windows_file=None,
-                                matrices_override=matrices,
-                                time_windows_override=time_windows,
-                                day_horizon=args.day_horizon,
-                                service_time=SERVICE_TIME,
-                                cost_per_km=COST_PER_KM,
-                                vehicle_fixed_cost=VEHICLE_FIXED_COST,
-                                penalty_horizon_per_min=PENALTY_HORIZON,
-                                t_max=t_max,
-                                t_min=args.t_min,
-                                alpha=alpha,
-                                iters_per_T=iters,
-                                neighborhood=neigh,
-                                seed=None,
-                                time_weight=args.time_weight,
-                            )
-                            wall = time.time() - start
-                            init_m = stats.get('initial_metrics') or {}
-                            best_m = stats.get('best_metrics') or {}
-                            initial_cost = stats.get('initial_cost')
-                            improvement_pct = (initial_cost - best_cost)/initial_cost if initial_cost else None
-                            row = {
-                                'dataset': dataset_tag,
-                                'size': size,
-                                'window_profile': profile,
-                                't_max': t_max,
-                                't_min': args.t_min,
-                                'alpha': alpha,
-                                'iters_per_T': iters,
-                                'neighborhood': neigh,
-                                'day_horizon': args.day_horizon,
-                                'time_weight': args.time_weight,
-                                'initial_cost': initial_cost,
-                                'best_cost': best_cost,
-                                'improvement_pct': improvement_pct,
-                                'vehicles_initial': init_m.get('vehicles_used'),
-                                'vehicles_best': best_m.get('vehicles_used'),
-                                'distance_initial': init_m.get('total_distance_km'),
-                                'distance_best': best_m.get('total_distance_km'),
-                                'makespan_initial': init_m.get('makespan_E'),
-                                'makespan_best': best_m.get('makespan_E'),
-                                'waiting_initial': init_m.get('waiting_E'),
-                                'waiting_best': best_m.get('waiting_E'),
-                                'accepted_moves': stats.get('accepted_moves'),
-                                'improving_moves': stats.get('improving_moves'),
-                                'epochs': stats.get('epochs'),
-                                'runtime_seconds': wall,
-                            }
-                            writer.writerow(row)
-                            print(f"[OK] {dataset_tag} t_max={t_max} alpha={alpha} iters={iters} neigh={neigh} imp={improvement_pct:.4f if improvement_pct is not None else float('nan')} time={wall:.1f}s")
+        def emit(row: dict):
+            # Jedyny writer: wiersz trafia na dysk od razu, więc przerwanie traci tylko komórki w toku
+            nonlocal total_jobs
+            writer.writerow(row)
+            f_csv.flush()
+            total_jobs += 1
+            imp = row['improvement_pct']
+            imp_txt = f'{imp:.4f}' if imp is not None else 'nan'
+            print(f"[OK] {row['dataset']} t_max={row['t_max']} alpha={row['alpha']} iters={row['iters_per_T']} "
+                  f"neigh={row['neighborhood']} imp={imp_txt} time={row['runtime_seconds']:.1f}s")
+
+        if args.workers <= 1:
+            for cell in cells:
+                emit(run_cell(cell))
+        else:
+            pool = ProcessPoolExecutor(max_workers=args.workers)
+            try:
+                futures = [pool.submit(run_cell, cell) for cell in cells]
+                for fut in as_completed(futures):
+                    emit(fut.result())
+            except BaseException as e:
+                # błąd workera lub Ctrl+C – anuluj kolejkę, nie czekaj na resztę zadań
+                if isinstance(e, KeyboardInterrupt):
+                    print('[INTERRUPT] Przerwano – zapisane wiersze pozostają w CSV, użyj --resume.')
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise
+            pool.shutdown()
     print(f'Zakończono: {total_jobs} uruchomień SA.')
 
 if __name__ == '__main__':